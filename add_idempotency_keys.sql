@@ -0,0 +1,12 @@
+-- Ключи идемпотентности для POST /api/orders/ и POST /api/payments/
+CREATE TABLE IF NOT EXISTS idempotency_key (
+    idempotency_key VARCHAR(100) NOT NULL,
+    scope VARCHAR(50) NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    status_code INT,
+    response_body JSONB,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (idempotency_key, scope)
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_key_created ON idempotency_key(created_at);
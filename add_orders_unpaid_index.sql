@@ -0,0 +1,2 @@
+-- Выбор заказа в форме платежа: только неоплаченные заказы, новые сверху
+CREATE INDEX IF NOT EXISTS idx_orders_unpaid ON orders(order_date, order_id) WHERE status IN ('Принят', 'В обработке');
@@ -0,0 +1,2 @@
+-- Keyset-пагинация списка платежей (ORDER BY payment_date DESC, payment_id DESC)
+CREATE INDEX IF NOT EXISTS idx_payment_date ON payment(payment_date, payment_id);
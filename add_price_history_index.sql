@@ -0,0 +1,3 @@
+-- История цен одного товара (ORDER BY change_date DESC, price_history_id DESC)
+-- и поиск цены на момент времени — диапазонное сканирование одного индекса
+CREATE INDEX IF NOT EXISTS idx_price_history_product_date ON price_history(product_id, change_date, price_history_id);
@@ -0,0 +1,4 @@
+-- Keyset-пагинация списка закупок (ORDER BY purchase_date DESC, purchase_id DESC)
+CREATE INDEX IF NOT EXISTS idx_purchase_date ON purchase(purchase_date, purchase_id);
+-- Сводка по позициям закупки и поиск позиций по закупке
+CREATE INDEX IF NOT EXISTS idx_purchase_item_purchase ON purchase_item(purchase_id);
@@ -0,0 +1,9 @@
+-- Приёмка закупок (в том числе частичная): сколько по позиции уже принято на склад
+ALTER TABLE purchase_item ADD COLUMN IF NOT EXISTS received_quantity INT NOT NULL DEFAULT 0
+    CHECK (received_quantity BETWEEN 0 AND quantity);
+
+-- Уже доставленные закупки считаются принятыми полностью
+UPDATE purchase_item pi
+SET received_quantity = pi.quantity
+FROM purchase p
+WHERE p.purchase_id = pi.purchase_id AND p.status = 'delivered' AND pi.received_quantity = 0;
@@ -0,0 +1,8 @@
+-- Журнал движений сортируется и листается по (movement_date, movement_id):
+-- строки с NULL в movement_date выпадали бы из keyset-пагинации и из
+-- нарастающего остатка, поэтому дата движения обязательна
+UPDATE stock_movement
+SET movement_date = COALESCE(created_at, CURRENT_TIMESTAMP)
+WHERE movement_date IS NULL;
+
+ALTER TABLE stock_movement ALTER COLUMN movement_date SET NOT NULL;
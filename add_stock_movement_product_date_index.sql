@@ -0,0 +1,3 @@
+-- Журнал движений одного товара (фильтр по периоду, keyset-пагинация,
+-- нарастающий остаток) — диапазонное сканирование одного индекса
+CREATE INDEX IF NOT EXISTS idx_stock_movement_product_date ON stock_movement(product_id, movement_date, movement_id);
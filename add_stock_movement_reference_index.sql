@@ -0,0 +1,2 @@
+-- Поиск движений по документу-основанию (заказ/закупка): GET /api/orders/{id}/full и др.
+CREATE INDEX IF NOT EXISTS idx_stock_movement_reference ON stock_movement(reference_type, reference_id);
@@ -0,0 +1,30 @@
+-- Агрегированное обновление остатков и шардированные счётчики для "горячих" товаров
+ALTER TABLE product ADD COLUMN IF NOT EXISTS stock_shards INT NOT NULL DEFAULT 0
+    CHECK (stock_shards BETWEEN 0 AND 64);
+
+CREATE TABLE IF NOT EXISTS stock_counter_shard (
+    product_id INT NOT NULL REFERENCES product(product_id),
+    shard INT NOT NULL,
+    delta INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_id, shard)
+);
+
+-- Триггер пропускает движения, если приложение применяет остатки само
+CREATE OR REPLACE FUNCTION update_stock_quantity()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF current_setting('app.stock_deferred', true) = 'on' THEN
+        RETURN NEW;
+    END IF;
+    IF TG_OP = 'INSERT' THEN
+        IF NEW.movement_type = 'incoming' THEN
+            UPDATE Product SET stock_quantity = stock_quantity + NEW.quantity 
+            WHERE product_id = NEW.product_id;
+        ELSIF NEW.movement_type = 'outgoing' THEN
+            UPDATE Product SET stock_quantity = stock_quantity - NEW.quantity 
+            WHERE product_id = NEW.product_id;
+        END IF;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,8 @@
+-- Снимки остатков на начало дня: остаток на дату без суммирования всего журнала
+CREATE TABLE IF NOT EXISTS stock_snapshot (
+    product_id INT NOT NULL REFERENCES product(product_id),
+    snapshot_date DATE NOT NULL,
+    quantity INT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (product_id, snapshot_date)
+);
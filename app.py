@@ -20,6 +20,8 @@ from routes import audit
 from routes import payments
 from routes import price_history
 from routes import stock_movements
+from routes import exports
+from routes import documents
 
 # Импортируем функции для работы с БД
 from models.database import check_database_connection, get_db, create_tables, engine
@@ -50,6 +52,8 @@ app.include_router(audit.router)
 app.include_router(payments.router)
 app.include_router(price_history.router)
 app.include_router(stock_movements.router)
+app.include_router(exports.router)
+app.include_router(documents.router)
 
 # Настройка CORS (если нужно)
 if os.getenv("DEBUG", "False").lower() == "true":
@@ -172,7 +176,8 @@ async def check_tables():
         'category', 'customer', 'supplier', 'product',
         'orders', 'orders_item', 'payment', 'purchase',
         'purchase_item', 'price_history', 'stock_movement',
-        'audit_log', 'user_session'
+        'audit_log', 'user_session', 'stock_counter_shard',
+        'stock_snapshot', 'idempotency_key'
     ]
     
     missing_tables = [table for table in expected_tables if table not in tables]
@@ -0,0 +1,104 @@
+# benchmarks/bench_hot_sku.py
+# Конкурентное создание заказов на один "горячий" товар (заказов/сек):
+#   trigger    — как раньше: построчный триггер update_stock_quantity
+#   aggregated — core.stock: один UPDATE на товар, блокировки по порядку product_id
+#   sharded    — core.stock с product.stock_shards > 0 (без блокировки строки товара)
+#
+# Запуск: python benchmarks/bench_hot_sku.py [потоков] [секунд на режим] [шардов]
+# Нужен DATABASE_URL ТЕСТОВОЙ базы: заказы реально создаются, а в конце
+# удаляются, остаток и режим товара восстанавливаются.
+import os
+import sys
+import time
+import threading
+from decimal import Decimal
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import select, delete, update
+from models.database import SessionLocal
+from models.tables import Employee, Orders, OrderItem, Product, StockMovement, StockCounterShard
+from core.stock import fold_stock_shards
+from routes.orders import create_orders_batch
+
+
+def create_with_trigger(db, product_id: int, employee_id: int):
+    order = Orders(total_amount=Decimal("100"), status="Принят", employee_id=employee_id)
+    db.add(order)
+    db.flush()
+    db.add(OrderItem(order_id=order.order_id, product_id=product_id, quantity=1, item_price=Decimal("100")))
+    db.add(StockMovement(
+        product_id=product_id, movement_type="outgoing", quantity=1,
+        reference_id=order.order_id, reference_type="order", employee_id=employee_id
+    ))
+    db.commit()
+
+
+def create_with_core_stock(db, product_id: int, employee_id: int):
+    order = {"total_amount": 100, "items": [{"product_id": product_id, "quantity": 1, "item_price": 100}]}
+    result = create_orders_batch(db, [order], employee_id)
+    if "error" in result[0]:
+        raise RuntimeError(result[0]["error"])
+
+
+def run_mode(label: str, fn, product_id: int, employee_id: int, threads: int, seconds: float):
+    counter = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        db = SessionLocal()
+        try:
+            while time.perf_counter() < deadline:
+                fn(db, product_id, employee_id)
+                with lock:
+                    counter[0] += 1
+        finally:
+            db.close()
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    print(f"{label:11s} {threads} потоков: {counter[0] / seconds:8.1f} заказов/с")
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    shards = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+
+    db = SessionLocal()
+    employee_id = db.scalar(select(Employee.employee_id).where(Employee.is_active == True).limit(1))
+    product = db.scalar(select(Product).where(Product.is_active == True).order_by(Product.product_id).limit(1))
+    product_id, saved_stock, saved_shards = product.product_id, product.stock_quantity, product.stock_shards
+    last_order = db.scalar(select(Orders.order_id).order_by(Orders.order_id.desc()).limit(1)) or 0
+    last_movement = db.scalar(select(StockMovement.movement_id).order_by(StockMovement.movement_id.desc()).limit(1)) or 0
+
+    def set_mode(stock_shards: int):
+        db.execute(update(Product).where(Product.product_id == product_id)
+                   .values(stock_quantity=10_000_000, stock_shards=stock_shards))
+        db.commit()
+
+    try:
+        set_mode(0)
+        run_mode("trigger", create_with_trigger, product_id, employee_id, threads, seconds)
+        run_mode("aggregated", create_with_core_stock, product_id, employee_id, threads, seconds)
+        set_mode(shards)
+        run_mode(f"sharded/{shards}", create_with_core_stock, product_id, employee_id, threads, seconds)
+        fold_stock_shards(db)
+    finally:
+        db.rollback()
+        db.execute(delete(StockCounterShard).where(StockCounterShard.product_id == product_id))
+        db.execute(delete(StockMovement).where(StockMovement.movement_id > last_movement))
+        db.execute(delete(OrderItem).where(OrderItem.order_id > last_order))
+        db.execute(delete(Orders).where(Orders.order_id > last_order))
+        db.execute(update(Product).where(Product.product_id == product_id)
+                   .values(stock_quantity=saved_stock, stock_shards=saved_shards))
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
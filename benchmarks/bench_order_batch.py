@@ -0,0 +1,99 @@
+# benchmarks/bench_order_batch.py
+# Пропускная способность создания заказов (заказов/сек):
+#   по одному — как POST /api/orders/ (ORM, своя транзакция на заказ)
+#   пакетом   — create_orders_batch() из POST /api/orders/batch
+#
+# Запуск: python benchmarks/bench_order_batch.py [кол-во заказов] [позиций в заказе]
+# Нужен DATABASE_URL с заполненными товарами и сотрудником.
+# Все изменения выполняются во внешней транзакции и откатываются в конце.
+import os
+import sys
+import time
+from decimal import Decimal
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models.database import engine
+from models.tables import Employee, Orders, OrderItem, Product, StockMovement
+from routes.orders import create_orders_batch
+
+
+def make_orders(product_ids: list[int], count: int, lines: int) -> list[dict]:
+    orders = []
+    for i in range(count):
+        items = [
+            {"product_id": product_ids[(i + j) % len(product_ids)], "quantity": 1, "item_price": 100}
+            for j in range(lines)
+        ]
+        orders.append({"total_amount": 100 * lines, "status": "Принят", "payment_type": "card", "items": items})
+    return orders
+
+
+def create_one_by_one(db: Session, orders: list[dict], employee_id: int):
+    # Повторяет routes.orders.create_order
+    for order_data in orders:
+        order = Orders(
+            total_amount=Decimal(str(order_data["total_amount"])),
+            status=order_data["status"],
+            employee_id=employee_id,
+            payment_type=order_data["payment_type"]
+        )
+        db.add(order)
+        db.flush()
+        for item in order_data["items"]:
+            db.add(OrderItem(
+                order_id=order.order_id,
+                product_id=item["product_id"],
+                quantity=item["quantity"],
+                item_price=Decimal(str(item["item_price"]))
+            ))
+            db.add(StockMovement(
+                product_id=item["product_id"],
+                movement_type="outgoing",
+                quantity=item["quantity"],
+                reference_id=order.order_id,
+                reference_type="order",
+                employee_id=employee_id,
+                notes=f"Заказ #{order.order_id}"
+            ))
+        db.commit()
+
+
+def run(label: str, fn, orders: list[dict]):
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        db = Session(bind=connection, join_transaction_mode="create_savepoint")
+        try:
+            employee_id = db.scalar(select(Employee.employee_id).where(Employee.is_active == True).limit(1))
+            start = time.perf_counter()
+            fn(db, orders, employee_id)
+            elapsed = time.perf_counter() - start
+        finally:
+            db.close()
+            transaction.rollback()
+    print(f"{label:12s} {len(orders)} заказов за {elapsed:6.2f} с  ->  {len(orders) / elapsed:8.1f} заказов/с")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    with Session(engine) as db:
+        product_ids = db.scalars(
+            select(Product.product_id)
+            .where(Product.is_active == True, Product.stock_quantity >= count)
+            .limit(50)
+        ).all()
+    if len(product_ids) < lines:
+        print(f"Нужно хотя бы {lines} активных товаров с остатком >= {count}")
+        return
+
+    orders = make_orders(list(product_ids), count, lines)
+    run("по одному", create_one_by_one, orders)
+    run("пакетом", create_orders_batch, orders)
+
+
+if __name__ == "__main__":
+    main()
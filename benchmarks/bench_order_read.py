@@ -0,0 +1,67 @@
+# benchmarks/bench_order_read.py
+# Задержка открытия заказа:
+#   до    — то, что делает table_view.html: GET /api/orders/{id} (2 запроса)
+#           + /api/orders/customers и /api/orders/products для названий
+#   после — GET /api/orders/{id}/full (один запрос, JSON собирает PostgreSQL)
+#
+# Запуск: python benchmarks/bench_order_read.py [кол-во заказов]
+# Нужен DATABASE_URL; только чтение.
+import os
+import sys
+import time
+import statistics
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import select, func
+from models.database import SessionLocal
+from models.tables import Orders, OrderItem, Customer, Product
+from routes.orders import ORDER_AGGREGATE_SQL, customer_rows, product_rows
+
+
+def read_before(db, order_id: int):
+    db.scalar(select(Orders).where(Orders.order_id == order_id))
+    db.scalars(select(OrderItem).where(OrderItem.order_id == order_id)).all()
+    customer_rows.dump_json(db.execute(customer_rows.select()).all())
+    product_rows.dump_json(db.execute(product_rows.select().where(Product.is_active == True)).all())
+    db.expunge_all()
+
+
+def read_after(db, order_id: int):
+    db.scalar(ORDER_AGGREGATE_SQL, {"order_id": order_id})
+
+
+def measure(db, fn, order_ids: list[int]) -> list[float]:
+    timings = []
+    for order_id in order_ids:
+        start = time.perf_counter()
+        fn(db, order_id)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label: str, timings: list[float]):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1] if len(timings) >= 20 else timings[-1]
+    print(f"{label:6s} p50 {statistics.median(timings):7.2f} мс   p95 {p95:7.2f} мс")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    db = SessionLocal()
+    try:
+        order_ids = db.scalars(select(Orders.order_id).order_by(func.random()).limit(count)).all()
+        if not order_ids:
+            print("В базе нет заказов")
+            return
+        customers = db.scalar(select(func.count(Customer.customer_id)))
+        products = db.scalar(select(func.count(Product.product_id)))
+        print(f"Заказов: {len(order_ids)}, клиентов: {customers}, товаров: {products}")
+        report("до", measure(db, read_before, order_ids))
+        report("после", measure(db, read_after, order_ids))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
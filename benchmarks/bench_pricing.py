@@ -0,0 +1,78 @@
+# benchmarks/bench_pricing.py
+# Оценка заказа на 1000 позиций (мс на заказ):
+#   по строке — цена каждого товара отдельным запросом, сумма в цикле
+#   пакетно   — core.pricing: fetch_prices (один запрос) + price_items
+#   расчёт    — только price_items по уже загруженным ценам (без БД)
+#
+# Запуск: python benchmarks/bench_pricing.py [позиций] [повторов]
+# Нужен DATABASE_URL; только чтение.
+import os
+import sys
+import time
+import statistics
+from decimal import Decimal
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import select
+from models.database import SessionLocal
+from models.tables import Product
+from core.pricing import fetch_prices, price_items, CENT, HUNDRED
+
+
+def make_items(product_ids: list[int]) -> list[dict]:
+    return [
+        {"product_id": pid, "quantity": 1 + i % 7, "item_discount": Decimal(i % 20)}
+        for i, pid in enumerate(product_ids)
+    ]
+
+
+def price_per_line(db, items: list[dict]) -> Decimal:
+    total = Decimal("0.00")
+    for item in items:
+        price = db.scalar(select(Product.price).where(Product.product_id == item["product_id"]))
+        item["item_price"] = price
+        total += (item["quantity"] * price * (HUNDRED - item["item_discount"]) / HUNDRED).quantize(CENT)
+    return total
+
+
+def price_batched(db, items: list[dict]) -> Decimal:
+    return price_items(items, fetch_prices(db, (item["product_id"] for item in items)))
+
+
+def measure(fn, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    db = SessionLocal()
+    try:
+        product_ids = db.scalars(
+            select(Product.product_id).where(Product.is_active == True).order_by(Product.product_id).limit(lines)
+        ).all()
+        if not product_ids:
+            print("В базе нет активных товаров")
+            return
+        print(f"Позиций в заказе: {len(product_ids)}, повторов: {repeats}")
+        items = make_items(product_ids)
+        prices = fetch_prices(db, product_ids)
+
+        before = measure(lambda: price_per_line(db, items), repeats)
+        after = measure(lambda: price_batched(db, items), repeats)
+        compute = measure(lambda: price_items(items, prices), repeats)
+        print(f"по строке {before:8.2f} мс")
+        print(f"пакетно   {after:8.2f} мс  (x{before / after:.1f})")
+        print(f"расчёт    {compute:8.2f} мс")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
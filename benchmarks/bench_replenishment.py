@@ -0,0 +1,47 @@
+# benchmarks/bench_replenishment.py
+# Расчёт предложений по пополнению для всего каталога (core.replenishment):
+# синтетический каталог и сгруппированная история расхода за 90 дней,
+# замеряется только векторная часть (NumPy), без БД.
+#
+# Запуск: python benchmarks/bench_replenishment.py [товаров] [дней с продажами на товар]
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from core.replenishment import VELOCITY_WINDOWS, compute_suggestions
+
+
+def make_data(products: int, active_days: int, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    days = max(VELOCITY_WINDOWS)
+    product_ids = np.arange(1, products + 1, dtype=np.int64) * 3
+    movement_pids = np.repeat(product_ids, active_days)
+    movement_ages = np.concatenate([rng.choice(days, active_days, replace=False) for _ in range(products)])
+    movement_qty = rng.poisson(4, len(movement_pids)).astype(np.float64)
+    stock = rng.integers(0, 200, products).astype(np.float64)
+    on_order = np.where(rng.random(products) < 0.1, 50.0, 0.0)
+    lead_days = rng.integers(2, 21, products).astype(np.float64)
+    return product_ids, stock, on_order, lead_days, movement_pids, movement_ages, movement_qty
+
+
+def main():
+    products = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    active_days = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+
+    data = make_data(products, active_days)
+    compute_suggestions(*data)  # прогрев
+
+    start = time.perf_counter()
+    result = compute_suggestions(*data)
+    elapsed = time.perf_counter() - start
+
+    print(f"Товаров: {products}, строк истории: {len(data[4])}")
+    print(f"Расчёт: {elapsed * 1000:.1f} мс, к заказу: {int((result.quantity > 0).sum())} позиций")
+
+
+if __name__ == "__main__":
+    main()
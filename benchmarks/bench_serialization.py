@@ -0,0 +1,92 @@
+# benchmarks/bench_serialization.py
+# Сравнение стоимости сериализации списка товаров на одну строку:
+#   до  — ORM-объекты -> ProductResponse (from_attributes + @validator) -> JSON
+#   после — кортежи колонок -> RowSerializer (TypeAdapter по TypedDict) -> JSON
+#
+# Запуск: python benchmarks/bench_serialization.py [кол-во строк]
+# База данных не нужна: строки генерируются в памяти.
+import os
+import sys
+import json
+import time
+import warnings
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import List
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from pydantic import TypeAdapter
+from models.tables import Product
+from core.serialization import RowSerializer
+from schemas.product import ProductResponse, ProductRow
+
+
+def make_products(n: int) -> list[Product]:
+    now = datetime.now(timezone.utc)
+    return [
+        Product(
+            product_id=i,
+            product_name=f"Товар {i}",
+            description="Описание товара",
+            unit="шт",
+            category_id=i % 20 + 1,
+            price=Decimal("199.90"),
+            stock_quantity=i % 500,
+            barcode=f"460{i:010d}",
+            supplier_id=i % 7 + 1,
+            weight=Decimal("0.250"),
+            is_active=True,
+            created_at=now,
+            updated_at=None,
+            created_by_employee_id=1,
+            updated_by_employee_id=None,
+        )
+        for i in range(1, n + 1)
+    ]
+
+
+def make_rows(products: list[Product], fields: tuple) -> list[tuple]:
+    # Так выглядят строки выборки колонок (DECIMAL — Decimal)
+    return [tuple(getattr(p, name) for name in fields) for p in products]
+
+
+def measure(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    products = make_products(n)
+    serializer = RowSerializer(ProductRow, Product)
+    rows = make_rows(products, serializer.fields)
+
+    response_adapter = TypeAdapter(List[ProductResponse])
+
+    def before():
+        # Повторяет путь FastAPI для response_model=List[ProductResponse]
+        validated = response_adapter.validate_python(products, from_attributes=True)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            payload = response_adapter.dump_python(validated, mode="json")
+        return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+    def after():
+        return serializer.dump_json(rows)
+
+    t_before = measure(before)
+    t_after = measure(after)
+
+    print(f"Строк: {n}")
+    print(f"до:    {t_before * 1000:8.1f} мс  ({t_before / n * 1e6:6.2f} мкс/строка)")
+    print(f"после: {t_after * 1000:8.1f} мс  ({t_after / n * 1e6:6.2f} мкс/строка)")
+    print(f"ускорение: x{t_before / t_after:.1f}")
+
+
+if __name__ == "__main__":
+    main()
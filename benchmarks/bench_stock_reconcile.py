@@ -0,0 +1,90 @@
+# benchmarks/bench_stock_reconcile.py
+# Время сверки остатков с журналом (core.stock_reconcile) по числу потоков
+# на синтетическом журнале: товары и движения генерируются generate_series,
+# у каждого сотого товара остаток искажается.
+#
+# Запуск: python benchmarks/bench_stock_reconcile.py [товаров] [движений]
+# Нужен DATABASE_URL ТЕСТОВОЙ базы: товары и движения реально создаются,
+# а в конце удаляются.
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import delete, func, select, text
+from models.database import SessionLocal
+from models.tables import Category, Employee, Product, StockMovement
+from core.stock import stock_trigger_deferred
+from core.stock_reconcile import reconcile_stock
+
+DRIFT_EVERY = 100
+
+
+def main():
+    products = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    movements = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000
+
+    db = SessionLocal()
+    employee_id = db.scalar(select(Employee.employee_id).where(Employee.is_active == True).limit(1))
+    category_id = db.scalar(select(Category.category_id).limit(1))
+    last_product = db.scalar(select(func.max(Product.product_id))) or 0
+    last_movement = db.scalar(select(func.max(StockMovement.movement_id))) or 0
+
+    try:
+        started = time.perf_counter()
+        db.execute(text("""
+            INSERT INTO product (product_name, unit, category_id, price)
+            SELECT 'bench-reconcile-' || g, 'шт', :category_id, 1
+            FROM generate_series(1, :products) g
+        """), {"category_id": category_id, "products": products})
+        first = db.scalar(select(func.min(Product.product_id)).where(Product.product_id > last_product))
+        with stock_trigger_deferred(db):
+            db.execute(text("""
+                INSERT INTO stock_movement (product_id, movement_type, quantity, movement_date, employee_id)
+                SELECT :first + g % :products,
+                       CASE WHEN g % 3 = 0 THEN 'outgoing' ELSE 'incoming' END,
+                       CASE WHEN g % 3 = 0 THEN 1 ELSE 1 + g % 5 END,
+                       now() - (g % 365) * interval '1 day',
+                       :employee_id
+                FROM generate_series(1, :movements) g
+            """), {"first": first, "products": products, "movements": movements, "employee_id": employee_id})
+        # Остаток = журнал, кроме каждого DRIFT_EVERY-го товара
+        db.execute(text("""
+            UPDATE product p
+            SET stock_quantity = GREATEST(l.quantity, 0) + CASE WHEN p.product_id % :every = 0 THEN 3 ELSE 0 END
+            FROM (
+                SELECT product_id,
+                       SUM(CASE movement_type WHEN 'incoming' THEN quantity ELSE -quantity END) AS quantity
+                FROM stock_movement
+                WHERE movement_id > :last_movement
+                GROUP BY product_id
+            ) l
+            WHERE p.product_id = l.product_id
+        """), {"every": DRIFT_EVERY, "last_movement": last_movement})
+        db.commit()
+        db.execute(text("ANALYZE product"))
+        db.execute(text("ANALYZE stock_movement"))
+        db.commit()
+        print(f"Подготовлено {products} товаров, {movements} движений за {time.perf_counter() - started:.1f} с")
+
+        for workers in (1, 2, 4, 8):
+            report = reconcile_stock(workers=workers)
+            print(
+                f"{workers} потоков: {report['elapsed_seconds']:7.3f} с, "
+                f"{report['batches']} пачек, расхождений {report['drifted']}"
+            )
+
+        report = reconcile_stock(fix_employee_id=employee_id)
+        print(f"С исправлением: {report['elapsed_seconds']:.3f} с, поправок {report['drifted']}")
+        print(f"После исправления расхождений: {reconcile_stock()['drifted']}")
+    finally:
+        db.rollback()
+        db.execute(delete(StockMovement).where(StockMovement.movement_id > last_movement))
+        db.execute(delete(Product).where(Product.product_id > last_product))
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# core/documents.py — Данные для печатных документов (чеки, накладные)
+#
+# Документы собираются в обычные dict'ы (их можно передать в процесс
+# вёрстки core.pdf) пакетно: шапки одним запросом с join'ами, позиции
+# с названиями товаров — вторым, сколько бы документов ни запрашивалось.
+from collections import defaultdict
+from typing import Dict, Iterable
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models.tables import (
+    Payment, Orders, Customer, Employee, OrderItem,
+    Purchase, PurchaseItem, Supplier, Product
+)
+
+
+def load_receipts(db: Session, payment_ids: Iterable[int]) -> Dict[int, dict]:
+    """payment_id -> данные чека"""
+    payment_ids = list(payment_ids)
+    if not payment_ids:
+        return {}
+
+    rows = db.execute(
+        select(
+            Payment.payment_id, Payment.payment_code, Payment.payment_date, Payment.order_id,
+            Payment.amount, Payment.payment_type, Payment.payment_status, Payment.receipt_number,
+            Orders.order_code, Customer.customer_name, Customer.phone,
+            Employee.full_name.label("employee_name")
+        )
+        .outerjoin(Orders, Orders.order_id == Payment.order_id)
+        .outerjoin(Customer, Customer.customer_id == Orders.customer_id)
+        .outerjoin(Employee, Employee.employee_id == Payment.employee_id)
+        .where(Payment.payment_id.in_(payment_ids))
+    ).all()
+
+    items = defaultdict(list)
+    order_ids = {row.order_id for row in rows if row.order_code is not None}
+    if order_ids:
+        for item in db.execute(
+            select(OrderItem.order_id, Product.product_name, OrderItem.quantity,
+                   OrderItem.item_price, OrderItem.item_discount)
+            .outerjoin(Product, Product.product_id == OrderItem.product_id)
+            .where(OrderItem.order_id.in_(order_ids))
+            .order_by(OrderItem.order_id, OrderItem.order_item_id)
+        ):
+            items[item.order_id].append(
+                (item.product_name, item.quantity, float(item.item_price), float(item.item_discount or 0))
+            )
+
+    return {
+        row.payment_id: {
+            "payment_id": row.payment_id,
+            "payment_code": row.payment_code,
+            "payment_date": row.payment_date,
+            "order_code": row.order_code,
+            "amount": float(row.amount),
+            "payment_type": row.payment_type,
+            "payment_status": row.payment_status,
+            "receipt_number": row.receipt_number,
+            "customer": {"customer_name": row.customer_name, "phone": row.phone} if row.customer_name else None,
+            "employee_name": row.employee_name,
+            "items": items.get(row.order_id, []),
+        }
+        for row in rows
+    }
+
+
+def load_invoices(db: Session, purchase_ids: Iterable[int]) -> Dict[int, dict]:
+    """purchase_id -> данные накладной"""
+    purchase_ids = list(purchase_ids)
+    if not purchase_ids:
+        return {}
+
+    rows = db.execute(
+        select(
+            Purchase.purchase_id, Purchase.purchase_code, Purchase.purchase_date,
+            Purchase.delivery_date, Purchase.status, Purchase.invoice_number, Purchase.total_amount,
+            Supplier.company_name, Supplier.inn, Supplier.contact_phone,
+            Employee.full_name.label("employee_name")
+        )
+        .outerjoin(Supplier, Supplier.supplier_id == Purchase.supplier_id)
+        .outerjoin(Employee, Employee.employee_id == Purchase.employee_id)
+        .where(Purchase.purchase_id.in_(purchase_ids))
+    ).all()
+
+    items = defaultdict(list)
+    for item in db.execute(
+        select(PurchaseItem.purchase_id, Product.product_name, PurchaseItem.quantity, PurchaseItem.unit_price)
+        .outerjoin(Product, Product.product_id == PurchaseItem.product_id)
+        .where(PurchaseItem.purchase_id.in_(purchase_ids))
+        .order_by(PurchaseItem.purchase_id, PurchaseItem.purchase_item_id)
+    ):
+        items[item.purchase_id].append((item.product_name, item.quantity, float(item.unit_price)))
+
+    return {
+        row.purchase_id: {
+            "purchase_id": row.purchase_id,
+            "purchase_code": row.purchase_code,
+            "purchase_date": row.purchase_date,
+            "delivery_date": row.delivery_date,
+            "status": row.status,
+            "invoice_number": row.invoice_number,
+            "total_amount": float(row.total_amount or 0),
+            "supplier": {
+                "company_name": row.company_name,
+                "inn": row.inn,
+                "contact_phone": row.contact_phone
+            } if row.company_name else None,
+            "employee_name": row.employee_name,
+            "items": items.get(row.purchase_id, []),
+        }
+        for row in rows
+    }
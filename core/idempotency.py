@@ -0,0 +1,149 @@
+# core/idempotency.py — Ключи идемпотентности для POST-запросов (повторы после таймаутов)
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Optional
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from models.tables import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAY_HEADER = "Idempotent-Replayed"
+
+# Сколько хранится ключ в БД и в памяти процесса
+IDEMPOTENCY_TTL = timedelta(hours=24)
+CACHE_SIZE = 10_000
+
+
+class _RecentKeys:
+    """LRU-кэш завершённых запросов в памяти процесса (с TTL)"""
+
+    def __init__(self, size: int, ttl: timedelta):
+        self._size = size
+        self._ttl = ttl.total_seconds()
+        self._items: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[tuple]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def put(self, key: tuple, value: tuple) -> None:
+        with self._lock:
+            self._items[key] = (time.monotonic() + self._ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self._size:
+                self._items.popitem(last=False)
+
+
+_recent = _RecentKeys(CACHE_SIZE, IDEMPOTENCY_TTL)
+
+
+def request_fingerprint(payload: Any, employee_id: int) -> str:
+    raw = json.dumps([employee_id, payload], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _replay(stored: tuple, fingerprint: str) -> JSONResponse:
+    request_hash, status_code, body = stored
+    if request_hash != fingerprint:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Ключ идемпотентности уже использован для другого запроса"
+        )
+    return JSONResponse(content=body, status_code=status_code, headers={REPLAY_HEADER: "true"})
+
+
+class IdempotentRequest:
+    """
+    Запрос с (возможным) ключом идемпотентности.
+
+    Если replay не None — запрос с этим ключом уже выполнен, нужно вернуть
+    replay как есть. Иначе ключ "захвачен" строкой в текущей транзакции:
+    параллельный повтор будет ждать на уникальном индексе до её завершения.
+    Вместо db.commit() эндпоинт вызывает commit(body) — ответ сохраняется
+    в той же транзакции, что и сами изменения.
+    """
+
+    def __init__(self, db: Session, key: Optional[str], scope: str, payload: Any, employee_id: int):
+        self.db = db
+        self.key = key
+        self.scope = scope
+        self.replay: Optional[JSONResponse] = None
+        if not key:
+            return
+
+        self.fingerprint = request_fingerprint(payload, employee_id)
+        cached = _recent.get((scope, key))
+        if cached is not None:
+            self.replay = _replay(cached, self.fingerprint)
+            return
+
+        claimed = db.scalar(
+            pg_insert(IdempotencyKey)
+            .values(idempotency_key=key, scope=scope, request_hash=self.fingerprint)
+            .on_conflict_do_nothing()
+            .returning(IdempotencyKey.idempotency_key)
+        )
+        if claimed:
+            return
+
+        row = db.execute(
+            select(IdempotencyKey.request_hash, IdempotencyKey.status_code, IdempotencyKey.response_body)
+            .where(IdempotencyKey.scope == scope, IdempotencyKey.idempotency_key == key)
+        ).one_or_none()
+        if row is None or row.status_code is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Запрос с этим ключом идемпотентности ещё выполняется"
+            )
+        stored = (row.request_hash, row.status_code, row.response_body)
+        _recent.put((scope, key), stored)
+        self.replay = _replay(stored, self.fingerprint)
+
+    def commit(self, body: Any, status_code: int = 200) -> None:
+        """Сохраняет ответ под ключом и фиксирует транзакцию"""
+        if self.key:
+            self.db.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.scope == self.scope, IdempotencyKey.idempotency_key == self.key)
+                .values(status_code=status_code, response_body=body)
+            )
+        self.db.commit()
+        if self.key:
+            _recent.put((self.scope, self.key), (self.fingerprint, status_code, body))
+
+
+def cleanup_expired(db: Session) -> int:
+    """Удаляет ключи старше IDEMPOTENCY_TTL (по индексу created_at)"""
+    result = db.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.created_at < func.now() - IDEMPOTENCY_TTL)
+    )
+    db.commit()
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    # Периодическая задача: python -m core.idempotency
+    from models.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        print(f"Удалено просроченных ключей идемпотентности: {cleanup_expired(db)}")
+    finally:
+        db.close()
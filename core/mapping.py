@@ -20,6 +20,9 @@ TABLE_NAMES_MAPPING = {
     "purchase_item": "Позиции закупок",
     "price_history": "История цен",
     "stock_movement": "Движение товаров",
+    "stock_counter_shard": "Шарды остатков",
+    "stock_snapshot": "Снимки остатков",
+    "idempotency_key": "Ключи идемпотентности",
 }
 
 # Соответствие технического имени столбца русскому названию
@@ -112,6 +115,15 @@ COLUMN_NAMES_MAPPING = {
     "movement_date": "Дата движения",
     "reference_id": "ID Ссылки",
     "reference_type": "Тип ссылки",
+    "stock_shards": "Шарды остатка",
+    "shard": "Шард",
+    "delta": "Изменение",
+    "snapshot_date": "Дата снимка",
+    "idempotency_key": "Ключ идемпотентности",
+    "scope": "Операция",
+    "request_hash": "Хэш запроса",
+    "status_code": "Код ответа",
+    "response_body": "Ответ",
 }
 
 # Маппинг таблиц на иконки Font Awesome
@@ -134,6 +146,9 @@ TABLE_ICONS_MAPPING = {
     'audit_log': 'fa-clipboard-list',  # Аудит - чек-лист
     'user_session': 'fa-sign-in-alt',  # Сессии - вход
     'inventory_transaction': 'fa-arrows-alt-v',  # Транзакции склада
+    'stock_counter_shard': 'fa-th',  # Шарды остатков - сетка
+    'stock_snapshot': 'fa-camera',  # Снимки остатков - фотоаппарат
+    'idempotency_key': 'fa-fingerprint',  # Ключи идемпотентности - отпечаток
 }
 
 
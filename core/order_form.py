@@ -0,0 +1,38 @@
+# core/order_form.py — Данные для формы заказа (клиенты, товары) в компактном виде с кэшем
+from sqlalchemy import Float, cast, select
+
+from models.tables import Customer, Product
+from core.row_cache import CachedRows, CachedPayload
+from core.stock import current_stock
+
+# Клиенты меняются редко, остатки товаров — с каждым заказом.
+# ttl ограничивает устаревание при изменениях из других процессов.
+order_form_customers = CachedRows(
+    "customers",
+    lambda db: db.execute(
+        select(Customer.customer_id, Customer.customer_name).order_by(Customer.customer_name)
+    ).all(),
+    ttl=300
+)
+
+def _products(db):
+    """Активные товары; остаток — с учётом несвёрнутых шардов "горячих" товаров"""
+    current, shards = current_stock()
+    return db.execute(
+        select(Product.product_id, Product.product_name, cast(Product.price, Float), current)
+        .outerjoin(shards, shards.c.product_id == Product.product_id)
+        .where(Product.is_active == True)
+        .order_by(Product.product_name)
+    ).all()
+
+
+order_form_products = CachedRows("products", _products, ttl=30)
+
+order_form = CachedPayload(
+    order_form_customers,
+    order_form_products,
+    fields={
+        "customers": ["customer_id", "customer_name"],
+        "products": ["product_id", "product_name", "price", "stock_quantity"]
+    }
+)
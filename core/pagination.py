@@ -0,0 +1,60 @@
+# core/pagination.py — Keyset-пагинация (по курсору) для списков
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Callable, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_
+
+# Заголовок ответа с курсором следующей страницы (тело ответа остаётся списком)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(*values: Any) -> str:
+    """Курсор — это значения ключа сортировки последней строки страницы"""
+    raw = json.dumps([_plain(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str], *parsers: Callable[[Any], Any]) -> Optional[Tuple]:
+    """
+    Разбирает курсор; parsers приводят значения к нужным типам
+    (например, datetime.fromisoformat, int). Некорректный курсор — 400.
+    """
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if len(values) != len(parsers):
+            raise ValueError
+        return tuple(parse(value) for parse, value in zip(parsers, values))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Некорректный курсор")
+
+
+def keyset(query, columns: Sequence[Any], after: Optional[Tuple], limit: int, descending: bool = True):
+    """
+    Добавляет к запросу условие "после курсора", сортировку по ключу
+    и LIMIT на одну строку больше (чтобы понять, есть ли следующая страница).
+    Последняя колонка ключа должна быть уникальной (обычно первичный ключ).
+    """
+    if after is not None:
+        key = tuple_(*columns)
+        query = query.where(key < tuple_(*after) if descending else key > tuple_(*after))
+    order = [c.desc() for c in columns] if descending else list(columns)
+    return query.order_by(*order).limit(limit + 1)
+
+
+def split_page(rows: Sequence[Any], limit: int, key: Callable[[Any], Tuple]) -> Tuple[Sequence[Any], dict]:
+    """Отрезает лишнюю строку и формирует заголовок с курсором следующей страницы"""
+    if len(rows) <= limit:
+        return rows, {}
+    rows = rows[:limit]
+    return rows, {NEXT_CURSOR_HEADER: encode_cursor(*key(rows[-1]))}
@@ -0,0 +1,423 @@
+# core/pdf.py — Формирование PDF (чеки, накладные) в пуле процессов
+#
+# Маршруты собирают данные документа (core.documents — обычные dict'ы,
+# их можно передать в другой процесс), а вёрстка выполняется здесь,
+# в отдельных процессах, чтобы не занимать CPU обработчиков запросов.
+#
+# Настройки (переменные окружения):
+#   PDF_FONT_DIR  — каталог со шрифтами (DejaVuSans.ttf/DejaVuSans-Bold.ttf или arial.ttf/arialbd.ttf)
+#   PDF_WORKERS   — число процессов вёрстки; 0 — верстать в потоке без пула
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import Dict, Optional, Tuple
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Table, TableStyle
+
+FONT_DIRS = (
+    os.getenv("PDF_FONT_DIR"),
+    "/usr/share/fonts/truetype/dejavu",
+    "/usr/share/fonts/dejavu",
+    "C:/Windows/Fonts",
+)
+# Пары (обычный, жирный) в порядке предпочтения
+FONT_FILES = (
+    ("DejaVuSans.ttf", "DejaVuSans-Bold.ttf"),
+    ("arial.ttf", "arialbd.ttf"),
+)
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", min(4, os.cpu_count() or 1)))
+
+# Увеличивать при изменении вёрстки: входит в ключ кэша core.pdf_cache
+RENDER_VERSION = 2
+
+_fonts_registered = False
+_fonts_lock = threading.Lock()
+
+
+def register_fonts() -> None:
+    """Регистрирует шрифты с кириллицей один раз на процесс"""
+    global _fonts_registered
+    if _fonts_registered:
+        return
+    with _fonts_lock:
+        if _fonts_registered:
+            return
+        for font_dir in filter(None, FONT_DIRS):
+            for regular, bold in FONT_FILES:
+                regular_path = os.path.join(font_dir, regular)
+                bold_path = os.path.join(font_dir, bold)
+                if os.path.exists(regular_path) and os.path.exists(bold_path):
+                    pdfmetrics.registerFont(TTFont('DejaVu', regular_path))
+                    pdfmetrics.registerFont(TTFont('DejaVuBold', bold_path))
+                    _fonts_registered = True
+                    return
+        raise RuntimeError("Не найдены шрифты для PDF: укажите каталог в PDF_FONT_DIR")
+
+
+ITEMS_TABLE_STYLE = [
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#6a11cb')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('ALIGN', (2, 0), (2, -1), 'CENTER'),
+    ('ALIGN', (3, 0), (-1, -1), 'RIGHT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'DejaVuBold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('FONTNAME', (0, 1), (-1, -1), 'DejaVu'),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('TOPPADDING', (0, 1), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e0e0e0')),
+    ('LINEABOVE', (0, 0), (-1, 0), 2, colors.HexColor('#6a11cb')),
+    ('LINEBELOW', (0, 0), (-1, 0), 2, colors.HexColor('#6a11cb')),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')])
+]
+
+
+def _items_table(rows) -> Table:
+    """rows: (наименование, кол-во, цена, сумма)"""
+    table_data = [["№", "Наименование", "Кол-во", "Цена", "Сумма"]]
+    for idx, (product_name, quantity, price, total) in enumerate(rows, 1):
+        table_data.append([
+            str(idx),
+            (product_name or "—")[:30],
+            str(quantity),
+            f"{price:.2f} ₽",
+            f"{total:.2f} ₽"
+        ])
+    return Table(table_data, colWidths=[30, 250, 60, 80, 95])
+
+
+def _draw_receipt(c, doc: dict) -> None:
+    width, height = A4
+
+    c.setFillColorRGB(0.42, 0.07, 0.8)
+    c.rect(0, height - 100, width, 100, fill=1, stroke=0)
+
+    c.setFillColorRGB(1, 1, 1)
+    c.setFont("DejaVuBold", 42)
+    c.drawString(40, height - 60, "ЧЕК")
+    c.setFont("DejaVu", 13)
+    c.drawString(40, height - 82, f"№ {doc['payment_code'] or doc['payment_id']}")
+    c.drawString(width - 200, height - 82, f"{doc['payment_date'].strftime('%d.%m.%Y %H:%M')}")
+
+    y = height - 120
+
+    c.setFillColorRGB(0.95, 0.96, 0.98)
+    c.roundRect(30, y - 100, width - 60, 95, 15, fill=1, stroke=0)
+    c.setStrokeColorRGB(0.42, 0.07, 0.8)
+    c.setLineWidth(2)
+    c.roundRect(30, y - 100, width - 60, 95, 15, fill=0, stroke=1)
+
+    c.setFillColorRGB(0, 0, 0)
+    c.setFont("DejaVuBold", 11)
+    c.drawString(45, y - 20, "ИНФОРМАЦИЯ О ПЛАТЕЖЕ")
+
+    y -= 40
+    c.setFillColorRGB(0, 0, 0)
+    c.setFont("DejaVu", 10)
+    c.drawString(45, y, f"Заказ: {doc['order_code'] or '—'}")
+    c.drawString(width - 250, y, f"Тип оплаты: {doc['payment_type']}")
+    y -= 20
+    c.drawString(45, y, f"Статус: {doc['payment_status']}")
+    if doc["receipt_number"]:
+        c.drawString(width - 250, y, f"Номер чека: {doc['receipt_number']}")
+    y -= 25
+
+    customer = doc["customer"]
+    if customer or doc["employee_name"]:
+        y -= 15
+        card_width = (width - 80) / 2
+
+        if customer:
+            c.setFillColorRGB(0.95, 0.96, 0.98)
+            c.roundRect(30, y - 70, card_width, 65, 12, fill=1, stroke=0)
+            c.setStrokeColorRGB(0.42, 0.07, 0.8)
+            c.setLineWidth(1.5)
+            c.roundRect(30, y - 70, card_width, 65, 12, fill=0, stroke=1)
+
+            c.setFillColorRGB(0, 0, 0)
+            c.setFont("DejaVuBold", 10)
+            c.drawString(45, y - 15, "КЛИЕНТ")
+            c.setFont("DejaVu", 9)
+            c.drawString(45, y - 35, f"{customer['customer_name']}")
+            if customer["phone"]:
+                c.drawString(45, y - 50, f"Тел: {customer['phone']}")
+
+        if doc["employee_name"]:
+            c.setFillColorRGB(0.95, 0.96, 0.98)
+            c.roundRect(width - 30 - card_width, y - 70, card_width, 65, 12, fill=1, stroke=0)
+            c.setStrokeColorRGB(0.42, 0.07, 0.8)
+            c.setLineWidth(1.5)
+            c.roundRect(width - 30 - card_width, y - 70, card_width, 65, 12, fill=0, stroke=1)
+
+            c.setFillColorRGB(0, 0, 0)
+            c.setFont("DejaVuBold", 10)
+            c.drawString(width - 15 - card_width, y - 15, "КАССИР")
+            c.setFont("DejaVu", 9)
+            c.drawString(width - 15 - card_width, y - 35, f"{doc['employee_name']}")
+
+        y -= 85
+
+    items = doc["items"]
+    if items:
+        y -= 25
+        c.setFillColorRGB(0, 0, 0)
+        c.setFont("DejaVuBold", 12)
+        c.drawString(40, y, "ТОВАРЫ")
+        y -= 30
+
+        table = _items_table(
+            (name, quantity, price, quantity * price * (1 - discount / 100))
+            for name, quantity, price, discount in items
+        )
+        table.setStyle(TableStyle(ITEMS_TABLE_STYLE))
+        table.wrapOn(c, width, height)
+        table.drawOn(c, 40, y - (len(items) + 1) * 25)
+        y = y - (len(items) + 1) * 25 - 40
+
+    c.setFillColorRGB(0.42, 0.07, 0.8)
+    c.roundRect(width - 280, y - 55, 250, 50, 10, fill=1, stroke=0)
+
+    c.setFillColorRGB(1, 1, 1)
+    c.setFont("DejaVuBold", 18)
+    c.drawString(width - 265, y - 25, "ОПЛАЧЕНО")
+    c.setFont("DejaVuBold", 22)
+    c.drawString(width - 265, y - 45, f"{doc['amount']:.2f} ₽")
+
+    c.setFillColorRGB(0, 0, 0)
+    c.setFont("DejaVuBold", 11)
+    c.drawString(40, 35, "Спасибо за покупку!")
+    c.setFillColorRGB(0.3, 0.3, 0.3)
+    c.setFont("DejaVu", 8)
+    c.drawString(width - 220, 20, "Система управления складом")
+
+
+def _draw_invoice(c, doc: dict) -> None:
+    width, height = A4
+
+    # Заголовок
+    c.setFillColorRGB(0.42, 0.07, 0.8)
+    c.rect(0, height - 120, width, 120, fill=1, stroke=0)
+
+    c.setFillColorRGB(1, 1, 1)
+    c.setFont("DejaVuBold", 38)
+    c.drawString(40, height - 65, "НАКЛАДНАЯ")
+    c.setFont("DejaVu", 13)
+    c.drawString(40, height - 88, f"№ {doc['purchase_code']}")
+    c.drawString(width - 200, height - 88, f"{doc['purchase_date']}")
+
+    # Карточка с информацией о закупке
+    y = height - 140
+    c.setFillColorRGB(0.95, 0.96, 0.98)
+    c.roundRect(30, y - 110, width - 60, 105, 15, fill=1, stroke=0)
+    c.setStrokeColorRGB(0.42, 0.07, 0.8)
+    c.setLineWidth(2)
+    c.roundRect(30, y - 110, width - 60, 105, 15, fill=0, stroke=1)
+
+    c.setFillColorRGB(0, 0, 0)
+    c.setFont("DejaVuBold", 11)
+    c.drawString(45, y - 20, "ИНФОРМАЦИЯ О ЗАКУПКЕ")
+
+    y -= 45
+    c.setFillColorRGB(0, 0, 0)
+    c.setFont("DejaVu", 10)
+    c.drawString(45, y, f"Дата закупки: {doc['purchase_date']}")
+    c.drawString(width - 280, y, f"Статус: {doc['status']}")
+    y -= 22
+    if doc["delivery_date"]:
+        c.drawString(45, y, f"Дата доставки: {doc['delivery_date']}")
+    if doc["invoice_number"]:
+        c.drawString(width - 280, y, f"Номер счета: {doc['invoice_number']}")
+    y -= 25
+
+    # Карточки поставщика и ответственного
+    y -= 20
+    card_width = (width - 80) / 2
+
+    supplier = doc["supplier"]
+    if supplier:
+        c.setFillColorRGB(0.95, 0.96, 0.98)
+        c.roundRect(30, y - 85, card_width, 80, 12, fill=1, stroke=0)
+        c.setStrokeColorRGB(0.42, 0.07, 0.8)
+        c.setLineWidth(1.5)
+        c.roundRect(30, y - 85, card_width, 80, 12, fill=0, stroke=1)
+
+        c.setFillColorRGB(0, 0, 0)
+        c.setFont("DejaVuBold", 10)
+        c.drawString(45, y - 15, "ПОСТАВЩИК")
+        c.setFillColorRGB(0, 0, 0)
+        c.setFont("DejaVu", 9)
+        c.drawString(45, y - 35, f"{supplier['company_name']}")
+        if supplier["inn"]:
+            c.drawString(45, y - 50, f"ИНН: {supplier['inn']}")
+        if supplier["contact_phone"]:
+            c.drawString(45, y - 65, f"Тел: {supplier['contact_phone']}")
+
+    if doc["employee_name"]:
+        c.setFillColorRGB(0.95, 0.96, 0.98)
+        c.roundRect(width - 30 - card_width, y - 85, card_width, 80, 12, fill=1, stroke=0)
+        c.setStrokeColorRGB(0.42, 0.07, 0.8)
+        c.setLineWidth(1.5)
+        c.roundRect(width - 30 - card_width, y - 85, card_width, 80, 12, fill=0, stroke=1)
+
+        c.setFillColorRGB(0, 0, 0)
+        c.setFont("DejaVuBold", 10)
+        c.drawString(width - 15 - card_width, y - 15, "ОТВЕТСТВЕННЫЙ")
+        c.setFillColorRGB(0, 0, 0)
+        c.setFont("DejaVu", 9)
+        c.drawString(width - 15 - card_width, y - 40, f"{doc['employee_name']}")
+
+    y -= 100
+
+    # Таблица товаров
+    y -= 30
+    c.setFillColorRGB(0, 0, 0)
+    c.setFont("DejaVuBold", 12)
+    c.drawString(40, y, "ТОВАРЫ")
+    y -= 35
+
+    items = doc["items"]
+    table = _items_table(
+        (name, quantity, price, quantity * price)
+        for name, quantity, price in items
+    )
+    table.setStyle(TableStyle(ITEMS_TABLE_STYLE + [('ROUNDEDCORNERS', [15, 15, 15, 15])]))
+    table.wrapOn(c, width, height)
+    table.drawOn(c, 40, y - (len(items) + 1) * 25)
+
+    # Итого
+    y = y - (len(items) + 1) * 25 - 50
+    c.setFillColorRGB(0.42, 0.07, 0.8)
+    c.roundRect(width - 300, y - 65, 270, 60, 12, fill=1, stroke=0)
+
+    c.setFillColorRGB(1, 1, 1)
+    c.setFont("DejaVuBold", 16)
+    c.drawString(width - 285, y - 25, "ИТОГО")
+    c.setFont("DejaVuBold", 24)
+    c.drawString(width - 285, y - 50, f"{doc['total_amount']:.2f} ₽")
+
+    # Футер
+    c.setFillColorRGB(0, 0, 0)
+    c.setFont("DejaVuBold", 11)
+    c.drawString(40, 40, "Документ сформирован автоматически")
+    c.setFillColorRGB(0.3, 0.3, 0.3)
+    c.setFont("DejaVu", 8)
+    c.drawString(width - 220, 25, "Система управления складом")
+
+
+RENDERERS = {
+    "receipt": _draw_receipt,
+    "invoice": _draw_invoice,
+}
+
+
+def render_document(kind: str, doc: dict) -> Tuple[bytes, float]:
+    """Вёрстка одного документа; возвращает (PDF, секунды вёрстки). Выполняется в процессе пула."""
+    start = time.perf_counter()
+    register_fonts()
+    buffer = BytesIO()
+    # invariant=1: без даты создания и случайного ID в PDF — одни и те же
+    # данные дают одни и те же байты (на этом держатся ключ кэша и ETag)
+    c = canvas.Canvas(buffer, pagesize=A4, invariant=1)
+    RENDERERS[kind](c, doc)
+    c.save()
+    return buffer.getvalue(), time.perf_counter() - start
+
+
+class RenderMetrics:
+    """Счётчики вёрстки по видам документов (в памяти процесса приложения)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, dict] = {}
+
+    def record(self, kind: str, render_seconds: float, total_seconds: float, size: int = 0, error: bool = False):
+        with self._lock:
+            stats = self._stats.setdefault(kind, {
+                "count": 0, "errors": 0, "bytes": 0,
+                "render_ms_total": 0.0, "render_ms_max": 0.0, "wait_ms_total": 0.0
+            })
+            if error:
+                stats["errors"] += 1
+                return
+            render_ms = render_seconds * 1000
+            stats["count"] += 1
+            stats["bytes"] += size
+            stats["render_ms_total"] += render_ms
+            stats["render_ms_max"] = max(stats["render_ms_max"], render_ms)
+            # Ожидание в очереди пула и передача данных между процессами
+            stats["wait_ms_total"] += max(total_seconds * 1000 - render_ms, 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            result = {}
+            for kind, stats in self._stats.items():
+                count = stats["count"] or 1
+                result[kind] = {
+                    "count": stats["count"],
+                    "errors": stats["errors"],
+                    "bytes": stats["bytes"],
+                    "render_ms_avg": round(stats["render_ms_total"] / count, 2),
+                    "render_ms_max": round(stats["render_ms_max"], 2),
+                    "wait_ms_avg": round(stats["wait_ms_total"] / count, 2),
+                }
+            return {"workers": PDF_WORKERS, "documents": result}
+
+
+metrics = RenderMetrics()
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if PDF_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn — одинаково на Linux и Windows и безопасно для процесса с потоками
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=register_fonts
+            )
+        return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+async def render_pdf(kind: str, doc: dict) -> bytes:
+    """Формирует PDF в пуле процессов, не блокируя обработчик запроса"""
+    start = time.perf_counter()
+    try:
+        pdf, render_seconds = await asyncio.get_running_loop().run_in_executor(
+            _get_pool(), render_document, kind, doc
+        )
+    except BrokenProcessPool:
+        # Процесс пула упал — следующий вызов создаст пул заново
+        _reset_pool()
+        metrics.record(kind, 0, 0, error=True)
+        raise
+    except Exception:
+        metrics.record(kind, 0, 0, error=True)
+        raise
+    metrics.record(kind, render_seconds, time.perf_counter() - start, len(pdf))
+    return pdf
@@ -0,0 +1,180 @@
+# core/pdf_batch.py — Пакетная выгрузка PDF в потоковый ZIP с отслеживанием прогресса
+import asyncio
+import time
+import uuid
+import zipfile
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from models.database import SessionLocal
+from core.pdf import PDF_WORKERS
+from core.pdf_cache import cached_pdf
+
+# Сколько документов загружать из БД за раз и сколько верстать одновременно
+LOAD_CHUNK_SIZE = 100
+RENDER_WINDOW = max(PDF_WORKERS, 1) * 2
+# Сколько хранить сведения о завершённых выгрузках
+JOB_TTL_SECONDS = 3600
+
+
+class ExportJob:
+    """Состояние одной выгрузки (в памяти процесса, который её выполняет)"""
+
+    def __init__(self, kind: str, total: int, employee_id: int):
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.total = total
+        self.employee_id = employee_id
+        self.done = 0
+        self.failed: List[dict] = []
+        self.status = "running"
+        self.started_at = datetime.now()
+        self.finished_at: Optional[datetime] = None
+        self._finished_monotonic: Optional[float] = None
+
+    def finish(self, status: str) -> None:
+        self.status = status
+        self.finished_at = datetime.now()
+        self._finished_monotonic = time.monotonic()
+
+    def expired(self) -> bool:
+        return self._finished_monotonic is not None and time.monotonic() - self._finished_monotonic > JOB_TTL_SECONDS
+
+    def as_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "total": self.total,
+            "done": self.done,
+            "failed": len(self.failed),
+            "errors": self.failed[:100],
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+_jobs: Dict[str, ExportJob] = {}
+
+
+def create_job(kind: str, total: int, employee_id: int) -> ExportJob:
+    for job_id in [job_id for job_id, job in _jobs.items() if job.expired()]:
+        del _jobs[job_id]
+    job = ExportJob(kind, total, employee_id)
+    _jobs[job.job_id] = job
+    return job
+
+
+def get_job(job_id: str) -> Optional[ExportJob]:
+    return _jobs.get(job_id)
+
+
+class _ZipBuffer:
+    """Неперематываемый приёмник для zipfile: накопленное забирается после каждого файла"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _load_chunk(db: Session, loader: Callable[[Session, List[int]], Dict[int, dict]], chunk: List[int]) -> Dict[int, dict]:
+    docs = loader(db, chunk)
+    db.rollback()  # не держим транзакцию открытой, пока идёт вёрстка
+    return docs
+
+
+def _read_file(f) -> bytes:
+    with f:
+        return f.read()
+
+
+async def _render(kind: str, doc_id: int, doc: dict) -> tuple:
+    try:
+        f, pdf = await cached_pdf(kind, doc)
+        if f is not None:
+            pdf = await run_in_threadpool(_read_file, f)
+        return doc_id, doc, pdf, None
+    except Exception as e:
+        return doc_id, doc, None, f"{e.__class__.__name__}: {e}"
+
+
+async def stream_zip(
+    job: ExportJob,
+    pdf_kind: str,
+    ids: List[int],
+    loader: Callable[[Session, List[int]], Dict[int, dict]],
+    filename: Callable[[dict], str],
+) -> AsyncIterator[bytes]:
+    """
+    Генератор ZIP-архива для StreamingResponse.
+
+    Документы загружаются порциями по LOAD_CHUNK_SIZE (своя сессия БД —
+    сессия запроса к этому моменту уже закрыта), верстаются параллельно
+    не более RENDER_WINDOW штук, и каждый PDF попадает в архив и уходит
+    клиенту сразу по готовности. В памяти одновременно — только окно
+    документов, а не весь архив.
+    """
+    buffer = _ZipBuffer()
+    archive = zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED)
+    pending = set()
+
+    def add(result: tuple) -> bytes:
+        doc_id, doc, pdf, error = result
+        if error:
+            job.failed.append({"id": doc_id, "error": error})
+        else:
+            archive.writestr(filename(doc), pdf)
+            job.done += 1
+        return buffer.take()
+
+    db = SessionLocal()
+    try:
+        for start in range(0, len(ids), LOAD_CHUNK_SIZE):
+            chunk = ids[start:start + LOAD_CHUNK_SIZE]
+            # Загрузка — синхронные запросы, поэтому в пуле потоков, а не в цикле событий
+            docs = await run_in_threadpool(_load_chunk, db, loader, chunk)
+            for doc_id in chunk:
+                if doc_id not in docs:
+                    job.failed.append({"id": doc_id, "error": "Документ не найден"})
+                    continue
+                if len(pending) >= RENDER_WINDOW:
+                    finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in finished:
+                        yield add(task.result())
+                pending.add(asyncio.create_task(_render(pdf_kind, doc_id, docs[doc_id])))
+
+        while pending:
+            finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                yield add(task.result())
+
+        if job.failed:
+            archive.writestr("errors.txt", "\n".join(f"{e['id']}: {e['error']}" for e in job.failed))
+        archive.close()
+        yield buffer.take()
+        job.finish("done")
+    except (asyncio.CancelledError, GeneratorExit):
+        # Клиент прервал загрузку
+        job.finish("cancelled")
+        raise
+    except Exception:
+        job.finish("failed")
+        raise
+    finally:
+        for task in pending:
+            task.cancel()
+        db.close()
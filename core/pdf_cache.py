@@ -0,0 +1,181 @@
+# core/pdf_cache.py — Дисковый кэш готовых PDF с адресацией по содержимому
+#
+# Ключ — хэш исходных данных документа (core.documents) и версии вёрстки,
+# поэтому при изменении платежа/закупки документ просто получает новый
+# ключ, а старый файл со временем вытесняется (LRU по времени доступа).
+#
+# Настройки (переменные окружения):
+#   PDF_CACHE_DIR     — каталог кэша (по умолчанию во временном каталоге системы)
+#   PDF_CACHE_MAX_MB  — предельный размер кэша; 0 — кэш выключен
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+
+from core.pdf import RENDER_VERSION, render_pdf
+
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "warehouse-pdf-cache")
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_MB", 512)) * 1024 * 1024
+# Размер блока при отдаче файла из кэша
+STREAM_CHUNK_SIZE = 64 * 1024
+# После вытеснения кэш занимает не больше этой доли от предела
+EVICT_TO = 0.9
+
+
+def document_key(kind: str, doc: dict) -> str:
+    raw = json.dumps([RENDER_VERSION, kind, doc], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class PdfCache:
+    """
+    Файлы <каталог>/<2 символа ключа>/<ключ>.pdf. Время изменения файла
+    обновляется при каждом попадании и служит меткой для LRU-вытеснения.
+    Размер кэша считается приблизительно в памяти процесса и уточняется
+    полным обходом каталога только при превышении предела.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.pdf")
+
+    def _files(self):
+        for entry in os.scandir(self.directory):
+            if entry.is_dir():
+                for file in os.scandir(entry.path):
+                    if file.name.endswith(".pdf"):
+                        stat = file.stat()
+                        yield file.path, stat.st_size, stat.st_mtime
+
+    def open(self, key: str) -> Optional[BinaryIO]:
+        """
+        Открытый файл из кэша или None. Файл отдаётся открытым: если его
+        вытеснят (или удалит другой процесс) во время отдачи, чтение
+        открытого дескриптора всё равно дойдёт до конца.
+        """
+        path = self._path(key)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return f
+
+    def store(self, key: str, pdf: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Запись во временный файл и атомарная замена: читатель не увидит половину PDF
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._files())
+            else:
+                self._size += len(pdf)
+            if self._size > self.max_bytes:
+                self._evict(keep=path)
+
+    def _evict(self, keep: str) -> None:
+        """Удаляет самые давно использованные файлы (вызывается под блокировкой)"""
+        files = sorted(self._files(), key=lambda f: f[2])
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * EVICT_TO
+        for path, size, _ in files:
+            if total <= target:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                # Уже удалён другим процессом (или на Windows — открыт на чтение)
+                pass
+            total -= size
+            self.evicted += 1
+        self._size = total
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "max_bytes": self.max_bytes,
+                "bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evicted": self.evicted,
+            }
+
+
+pdf_cache = PdfCache(PDF_CACHE_DIR, PDF_CACHE_MAX_BYTES)
+
+
+async def cached_pdf(kind: str, doc: dict, key: Optional[str] = None) -> Tuple[Optional[BinaryIO], Optional[bytes]]:
+    """
+    (открытый файл из кэша, PDF): при попадании — файл (закрывает
+    вызывающий код) и None, иначе None и PDF после вёрстки (он же
+    сохраняется в кэш, если кэш включён). Файловые операции — в пуле потоков.
+    """
+    if pdf_cache.max_bytes <= 0:
+        return None, await render_pdf(kind, doc)
+    key = key or document_key(kind, doc)
+    f = await run_in_threadpool(pdf_cache.open, key)
+    if f is not None:
+        return f, None
+    pdf = await render_pdf(kind, doc)
+    await run_in_threadpool(pdf_cache.store, key, pdf)
+    return None, pdf
+
+
+def _iter_file(f: BinaryIO) -> Iterator[bytes]:
+    """Блоки открытого файла (StreamingResponse читает их в пуле потоков)"""
+    try:
+        while chunk := f.read(STREAM_CHUNK_SIZE):
+            yield chunk
+    finally:
+        f.close()
+
+
+async def pdf_response(request: Request, kind: str, doc: dict, filename: str) -> Response:
+    """
+    Ответ с PDF документа: строгий ETag (ключ содержимого), 304 при совпадении
+    If-None-Match без обращения к кэшу, файл из кэша — потоком из уже
+    открытого дескриптора (вытеснение файла не обрывает ответ).
+    """
+    key = document_key(kind, doc)
+    headers = {
+        "ETag": f'"{key}"',
+        "Cache-Control": "private, no-cache",
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    headers["Content-Disposition"] = f"attachment; filename={filename}"
+    f, pdf = await cached_pdf(kind, doc, key)
+    if f is None:
+        return Response(content=pdf, media_type="application/pdf", headers=headers)
+    headers["Content-Length"] = str(os.fstat(f.fileno()).st_size)
+    return StreamingResponse(_iter_file(f), media_type="application/pdf", headers=headers)
@@ -0,0 +1,182 @@
+# core/price_asof.py — Цена товара на момент времени (по price_history)
+#
+# Цена на момент t — new_price последнего изменения с change_date <= t.
+# Если до t изменений не было, но были позже — old_price первого из них
+# (цена, действовавшая до него). Если истории нет вовсе — текущая цена товара.
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import DateTime, Integer, column, func, select, true, values
+from sqlalchemy.orm import Session
+
+from models.tables import PriceHistory, Product
+
+# Сколько запросов по товару, прежде чем его история попадёт в кэш
+HOT_AFTER = 3
+PRICE_CACHE_SIZE = 1000
+PRICE_CACHE_TTL = 300
+
+
+def _naive(moment: datetime) -> datetime:
+    """price_history.change_date — TIMESTAMP без зоны; сравниваем в локальном времени"""
+    if moment.tzinfo is not None:
+        return moment.astimezone().replace(tzinfo=None)
+    return moment
+
+
+class _Intervals:
+    """История цен одного товара: границы интервалов и цена на каждом из них"""
+
+    def __init__(self, loaded_at: datetime, initial: Optional[Decimal], changes: Sequence[tuple]):
+        self.loaded_at = loaded_at
+        self.expires = time.monotonic() + PRICE_CACHE_TTL
+        self.bounds = [_naive(change_date) for change_date, _, _ in changes]
+        # prices[i] — цена на [bounds[i-1], bounds[i]); prices[0] — до первого изменения
+        first = changes[0][1] if changes and changes[0][1] is not None else initial
+        self.prices = [first] + [new_price for _, _, new_price in changes]
+
+    def price(self, moment: datetime) -> Optional[Decimal]:
+        return self.prices[bisect.bisect_right(self.bounds, moment)]
+
+
+class PriceIntervalCache:
+    """
+    Полная история цен "частых" товаров в памяти процесса (LRU). Ответ
+    из кэша даётся только для моментов не позже загрузки истории — про
+    более поздние изменения кэш знать не может, такие запросы идут в БД.
+    invalidate() вызывается при изменении цены в этом процессе, TTL
+    страхует от изменений из других процессов.
+    """
+
+    def __init__(self, max_products: int = PRICE_CACHE_SIZE, hot_after: int = HOT_AFTER):
+        self.max_products = max_products
+        self.hot_after = hot_after
+        self._entries: "OrderedDict[int, _Intervals]" = OrderedDict()
+        self._requests: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, product_id: int, moment: datetime) -> Tuple[bool, Optional[Decimal]]:
+        """(найдено, цена); заодно считает запросы по товару"""
+        with self._lock:
+            entry = self._entries.get(product_id)
+            if entry and entry.expires > time.monotonic() and moment <= entry.loaded_at:
+                self._entries.move_to_end(product_id)
+                self.hits += 1
+                return True, entry.price(moment)
+            self.misses += 1
+            self._requests[product_id] = self._requests.get(product_id, 0) + 1
+            if len(self._requests) > self.max_products * 10:
+                self._requests.clear()
+            return False, None
+
+    def wanted(self, product_ids: Sequence[int]) -> List[int]:
+        """Частые товары, историю которых стоит загрузить в кэш"""
+        with self._lock:
+            now = time.monotonic()
+            return [
+                product_id for product_id in set(product_ids)
+                if self._requests.get(product_id, 0) >= self.hot_after
+                and not (product_id in self._entries and self._entries[product_id].expires > now)
+            ]
+
+    def store(self, product_id: int, entry: _Intervals) -> None:
+        with self._lock:
+            self._entries[product_id] = entry
+            self._entries.move_to_end(product_id)
+            self._requests.pop(product_id, None)
+            while len(self._entries) > self.max_products:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, product_id: int) -> None:
+        with self._lock:
+            self._entries.pop(product_id, None)
+
+    def stats(self) -> dict:
+        return {"products": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+price_intervals = PriceIntervalCache()
+
+
+def _load_intervals(db: Session, product_ids: List[int]) -> None:
+    """Загружает полную историю цен товаров в кэш (диапазон индекса на товар)"""
+    loaded_at = _naive(db.scalar(select(func.now())))
+    rows = db.execute(
+        select(PriceHistory.product_id, PriceHistory.change_date, PriceHistory.old_price, PriceHistory.new_price)
+        .where(PriceHistory.product_id.in_(product_ids))
+        .order_by(PriceHistory.product_id, PriceHistory.change_date, PriceHistory.price_history_id)
+    ).all()
+    current = dict(db.execute(
+        select(Product.product_id, Product.price).where(Product.product_id.in_(product_ids))
+    ).all())
+
+    changes: Dict[int, List[tuple]] = {product_id: [] for product_id in current}
+    for product_id, change_date, old_price, new_price in rows:
+        if change_date is not None and product_id in changes:
+            changes[product_id].append((change_date, old_price, new_price))
+    for product_id, product_changes in changes.items():
+        price_intervals.store(product_id, _Intervals(loaded_at, current[product_id], product_changes))
+
+
+def _query_prices(db: Session, queries: List[Tuple[int, datetime]]) -> List[Optional[Decimal]]:
+    """Один запрос: для каждой пары (товар, момент) — LATERAL по индексу (product_id, change_date)"""
+    requested = values(column("n", Integer), column("product_id", Integer), column("at", DateTime), name="q").data(
+        [(n, product_id, moment) for n, (product_id, moment) in enumerate(queries)]
+    )
+    before = (
+        select(PriceHistory.new_price)
+        .where(PriceHistory.product_id == requested.c.product_id, PriceHistory.change_date <= requested.c.at)
+        .order_by(PriceHistory.change_date.desc(), PriceHistory.price_history_id.desc())
+        .limit(1)
+        .lateral("price_before")
+    )
+    after = (
+        select(PriceHistory.old_price)
+        .where(PriceHistory.product_id == requested.c.product_id, PriceHistory.change_date > requested.c.at)
+        .order_by(PriceHistory.change_date, PriceHistory.price_history_id)
+        .limit(1)
+        .lateral("price_after")
+    )
+    rows = db.execute(
+        select(requested.c.n, func.coalesce(before.c.new_price, after.c.old_price, Product.price))
+        .select_from(requested)
+        .join(Product, Product.product_id == requested.c.product_id)
+        .outerjoin(before, true())
+        .outerjoin(after, true())
+    ).all()
+
+    prices: List[Optional[Decimal]] = [None] * len(queries)
+    for n, price in rows:
+        prices[n] = price
+    return prices
+
+
+def prices_as_of(db: Session, queries: List[Tuple[int, datetime]]) -> List[Optional[Decimal]]:
+    """
+    Цены для списка (product_id, момент) в том же порядке; None — товара нет.
+    Частые товары отвечаются из кэша интервалов, остальные — одним запросом.
+    """
+    queries = [(product_id, _naive(moment)) for product_id, moment in queries]
+    prices: List[Optional[Decimal]] = [None] * len(queries)
+    missing = []
+    for n, (product_id, moment) in enumerate(queries):
+        found, price = price_intervals.lookup(product_id, moment)
+        if found:
+            prices[n] = price
+        else:
+            missing.append(n)
+
+    if missing:
+        for n, price in zip(missing, _query_prices(db, [queries[n] for n in missing])):
+            prices[n] = price
+        hot = price_intervals.wanted([queries[n][0] for n in missing])
+        if hot:
+            _load_intervals(db, hot)
+    return prices
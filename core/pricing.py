@@ -0,0 +1,60 @@
+# core/pricing.py — Расчёт стоимости заказа на сервере (цены из каталога, Decimal)
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterable, List
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models.tables import Product
+
+CENT = Decimal("0.01")
+HUNDRED = Decimal(100)
+
+
+class PricingError(ValueError):
+    """Позицию невозможно оценить (товар не найден или неактивен)"""
+
+
+def fetch_prices(db: Session, product_ids: Iterable[int]) -> Dict[int, Decimal]:
+    """Цены всех активных товаров из списка — одним запросом"""
+    product_ids = sorted(set(product_ids))
+    if not product_ids:
+        return {}
+    return dict(db.execute(
+        select(Product.product_id, Product.price)
+        .where(Product.product_id.in_(product_ids), Product.is_active == True)
+    ).all())
+
+
+def line_totals(items: List[dict]) -> List[Decimal]:
+    """
+    Стоимость позиций так же, как generated-колонка orders_item.total_price:
+    quantity * item_price * (1 - item_discount/100), округление до копеек.
+    """
+    return [
+        (quantity * price * (HUNDRED - discount) / HUNDRED).quantize(CENT, rounding=ROUND_HALF_UP)
+        for quantity, price, discount in zip(
+            [item["quantity"] for item in items],
+            [item["item_price"] for item in items],
+            [item["item_discount"] for item in items]
+        )
+    ]
+
+
+def price_items(items: List[dict], prices: Dict[int, Decimal]) -> Decimal:
+    """
+    Проставляет позициям цену из prices (присланная клиентом цена игнорируется)
+    и возвращает total_amount заказа — сумму позиций до скидки на заказ.
+    Скидку заказа применяет generated-колонка orders.final_amount.
+    """
+    for item in items:
+        price = prices.get(item["product_id"])
+        if price is None:
+            raise PricingError(f"Товар {item['product_id']} не найден или неактивен")
+        item["item_price"] = price
+    return sum(line_totals(items), Decimal("0.00"))
+
+
+def final_amount(total_amount: Decimal, discount_percent: Decimal) -> Decimal:
+    """Итог со скидкой на заказ (как orders.final_amount)"""
+    return (total_amount * (HUNDRED - discount_percent) / HUNDRED).quantize(CENT, rounding=ROUND_HALF_UP)
@@ -0,0 +1,111 @@
+# core/receiving.py — Приёмка закупки на склад одним набором запросов
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import exists, select, text
+from sqlalchemy.orm import Session
+
+from models.tables import Purchase, PurchaseItem
+from core.stock import apply_stock_deltas, stock_trigger_deferred
+
+# Все ещё не принятые позиции закупки
+_REMAINING_LINES = """
+    SELECT purchase_item_id, quantity - received_quantity AS quantity
+    FROM purchase_item
+    WHERE purchase_id = :purchase_id AND received_quantity < quantity
+"""
+
+# Выбранные позиции; количество NULL — весь остаток позиции
+_SELECTED_LINES = """
+    SELECT pi.purchase_item_id,
+           LEAST(COALESCE(r.quantity, pi.quantity - pi.received_quantity),
+                 pi.quantity - pi.received_quantity) AS quantity
+    FROM unnest(CAST(:item_ids AS integer[]), CAST(:quantities AS integer[]))
+         AS r(purchase_item_id, quantity)
+    JOIN purchase_item pi ON pi.purchase_item_id = r.purchase_item_id
+    WHERE pi.purchase_id = :purchase_id AND pi.received_quantity < pi.quantity
+"""
+
+# Отметка о приёмке и движения товара — одним INSERT ... SELECT
+_RECEIVE = """
+    WITH received AS (
+        UPDATE purchase_item pi
+        SET received_quantity = pi.received_quantity + lines.quantity
+        FROM ({lines}) lines
+        WHERE pi.purchase_item_id = lines.purchase_item_id AND lines.quantity > 0
+        RETURNING pi.product_id, lines.quantity
+    )
+    INSERT INTO stock_movement
+        (product_id, movement_type, quantity, reference_id, reference_type, employee_id, notes)
+    SELECT product_id, 'incoming', quantity, :purchase_id, 'purchase', :employee_id, :notes
+    FROM received
+    RETURNING product_id, quantity
+"""
+
+
+def unknown_purchase_items(db: Session, purchase_id: int, item_ids: Iterable[int]) -> List[int]:
+    """purchase_item_id из item_ids, которых нет в закупке purchase_id (одним запросом)"""
+    item_ids = set(item_ids)
+    found = db.scalars(
+        select(PurchaseItem.purchase_item_id)
+        .where(PurchaseItem.purchase_id == purchase_id, PurchaseItem.purchase_item_id.in_(item_ids))
+    ).all()
+    return sorted(item_ids - set(found))
+
+
+def receive_purchase(
+    db: Session,
+    purchase: Purchase,
+    employee_id: int,
+    lines: Optional[Dict[int, Optional[int]]] = None,
+) -> dict:
+    """
+    Принимает на склад всю закупку (lines=None) или выбранные позиции
+    (purchase_item_id -> количество, None — весь остаток позиции).
+    Позиции других закупок в lines молча пропускаются — вызывающий код
+    проверяет их заранее (unknown_purchase_items).
+
+    Принятое количество копится в purchase_item.received_quantity, поэтому
+    повторная приёмка не удваивает остатки. Движения вставляются одним
+    INSERT ... SELECT, остатки применяются агрегированно (apply_stock_deltas)
+    вместо построчного срабатывания триггера. Когда принято всё, закупка
+    переходит в статус "delivered". Строка закупки должна быть заблокирована
+    (SELECT ... FOR UPDATE) вызывающим кодом. Коммит — тоже на нём.
+    """
+    params = {
+        "purchase_id": purchase.purchase_id,
+        "employee_id": employee_id,
+        "notes": f"Закупка #{purchase.purchase_id}",
+    }
+    if lines is None:
+        statement = _RECEIVE.format(lines=_REMAINING_LINES)
+    else:
+        statement = _RECEIVE.format(lines=_SELECTED_LINES)
+        params["item_ids"] = list(lines)
+        params["quantities"] = list(lines.values())
+
+    db.flush()
+    with stock_trigger_deferred(db):
+        received = db.execute(text(statement), params).all()
+
+    deltas = defaultdict(int)
+    for product_id, quantity in received:
+        deltas[product_id] += quantity
+    apply_stock_deltas(db, dict(deltas))
+
+    remaining = db.scalar(select(exists().where(
+        PurchaseItem.purchase_id == purchase.purchase_id,
+        PurchaseItem.received_quantity < PurchaseItem.quantity
+    )))
+    if not remaining:
+        purchase.status = "delivered"
+        if not purchase.delivery_date:
+            purchase.delivery_date = date.today()
+
+    return {
+        "purchase_id": purchase.purchase_id,
+        "received_lines": len(received),
+        "received_quantity": sum(deltas.values()),
+        "status": purchase.status,
+    }
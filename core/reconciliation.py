@@ -0,0 +1,127 @@
+# core/reconciliation.py — Сверка платежей с заказами одним запросом
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Date, Integer, Numeric, String, cast, func, literal, null, select, union_all
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+from models.tables import Orders, Payment
+from core.serialization import RowSerializer
+from schemas.payment import ReconciliationRow
+
+# Учитываются только проведённые платежи
+PAID_PAYMENT_STATUS = "Оплачено"
+PAID_ORDER_STATUS = "Оплачен"
+# Заказы, которые ещё ждут оплаты (частичный индекс idx_orders_unpaid)
+UNPAID_ORDER_STATUSES = ("Принят", "В обработке")
+
+
+def _payment_ids(column=Payment.payment_id):
+    return func.string_agg(cast(column, String), aggregate_order_by(literal(","), column))
+
+
+def reconciliation_statement(date_from: Optional[datetime] = None, date_to: Optional[datetime] = None):
+    """
+    Один запрос (UNION ALL) со всеми расхождениями и дневными итогами:
+
+    - paid_without_payment — заказ в статусе "Оплачен" без проведённых платежей;
+    - overpaid            — сумма проведённых платежей больше orders.final_amount;
+    - duplicate_payment   — несколько проведённых платежей одного заказа на одну сумму;
+    - daily_total         — количество и сумма проведённых платежей по дням и типам оплаты.
+
+    Период фильтрует заказы по order_date (первые два раздела)
+    и платежи по payment_date (остальные). Возвращает (сериализатор, запрос).
+    """
+    order_filters = []
+    payment_filters = [Payment.payment_status == PAID_PAYMENT_STATUS]
+    if date_from:
+        order_filters.append(Orders.order_date >= date_from)
+        payment_filters.append(Payment.payment_date >= date_from)
+    if date_to:
+        order_filters.append(Orders.order_date < date_to)
+        payment_filters.append(Payment.payment_date < date_to)
+
+    # Все проведённые платежи по заказу, независимо от периода
+    paid_by_order = (
+        select(
+            Payment.order_id,
+            func.sum(Payment.amount).label("paid"),
+            func.count().label("payments_count"),
+            _payment_ids().label("payment_ids")
+        )
+        .where(Payment.payment_status == PAID_PAYMENT_STATUS)
+        .group_by(Payment.order_id)
+        .cte("paid_by_order")
+    )
+
+    paid_without_payment = (
+        select(
+            literal("paid_without_payment").label("section"),
+            Orders.order_id,
+            Orders.order_code,
+            cast(Orders.order_date, Date).label("day"),
+            Orders.payment_type,
+            cast(null(), String).label("payment_ids"),
+            literal(0).label("payments_count"),
+            cast(literal(0), Numeric(10, 2)).label("paid_amount"),
+            Orders.final_amount.label("expected_amount")
+        )
+        .outerjoin(paid_by_order, paid_by_order.c.order_id == Orders.order_id)
+        .where(Orders.status == PAID_ORDER_STATUS, paid_by_order.c.order_id.is_(None), *order_filters)
+    )
+
+    overpaid = (
+        select(
+            literal("overpaid"),
+            Orders.order_id,
+            Orders.order_code,
+            cast(Orders.order_date, Date),
+            Orders.payment_type,
+            paid_by_order.c.payment_ids,
+            paid_by_order.c.payments_count,
+            paid_by_order.c.paid,
+            Orders.final_amount
+        )
+        .join(paid_by_order, paid_by_order.c.order_id == Orders.order_id)
+        .where(paid_by_order.c.paid > Orders.final_amount, *order_filters)
+    )
+
+    duplicate_payment = (
+        select(
+            literal("duplicate_payment"),
+            Payment.order_id,
+            Orders.order_code,
+            cast(func.min(Payment.payment_date), Date),
+            cast(null(), String),
+            _payment_ids(),
+            func.count(),
+            func.sum(Payment.amount),
+            Orders.final_amount
+        )
+        .join(Orders, Orders.order_id == Payment.order_id)
+        .where(*payment_filters)
+        .group_by(Payment.order_id, Payment.amount, Orders.order_code, Orders.final_amount)
+        .having(func.count() > 1)
+    )
+
+    day = cast(Payment.payment_date, Date)
+    daily_total = (
+        select(
+            literal("daily_total"),
+            cast(null(), Integer),
+            cast(null(), String),
+            day,
+            Payment.payment_type,
+            cast(null(), String),
+            func.count(),
+            func.sum(Payment.amount),
+            cast(null(), Numeric(10, 2))
+        )
+        .where(*payment_filters)
+        .group_by(day, Payment.payment_type)
+    )
+
+    report = union_all(paid_without_payment, overpaid, duplicate_payment, daily_total).subquery("reconciliation")
+    serializer = RowSerializer(ReconciliationRow, report.c)
+    statement = serializer.select().order_by(report.c.section, report.c.day, report.c.order_id, report.c.payment_type)
+    return serializer, statement
@@ -0,0 +1,265 @@
+# core/replenishment.py — Предложения по пополнению запасов по скорости продаж
+#
+# Скорость расхода считается по истории stock_movement (outgoing) за несколько
+# окон, срок поставки — по закупкам поставщика (purchase_date -> delivery_date).
+# Вычисления векторные (NumPy) по всему каталогу сразу; из БД читаются только
+# сгруппированные данные, поэтому расчёт по всему каталогу занимает секунды.
+#
+# Пакетный запуск (например, по расписанию раз в сутки):
+#   python -m core.replenishment [--output drafts.json]
+import math
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import Date, Float, cast, func, select
+from sqlalchemy.orm import Session
+
+from models.tables import Product, Purchase, PurchaseItem, StockMovement, Supplier
+from core.stock import current_stock
+
+# Окна (в днях), по которым считается средний дневной расход
+VELOCITY_WINDOWS = (7, 30, 90)
+# Наибольшее окно: история расхода за этот срок читается целиком
+MAX_WINDOW_DAYS = 365
+# Срок поставки, если у поставщика ещё нет доставленных закупок
+DEFAULT_LEAD_TIME_DAYS = 7
+# Страховой запас и период до следующей проверки (в днях расхода)
+SAFETY_DAYS = 7
+REVIEW_DAYS = 14
+
+
+@dataclass
+class Suggestions:
+    """Результат расчёта по каталогу (массивы выровнены по product_ids)"""
+    product_ids: np.ndarray
+    velocity: np.ndarray
+    reorder_point: np.ndarray
+    quantity: np.ndarray
+
+
+def daily_matrix(product_ids: np.ndarray, movement_pids: np.ndarray, movement_ages: np.ndarray,
+                 movement_qty: np.ndarray, days: int) -> np.ndarray:
+    """
+    Матрица расхода [товар, день назад] из сгруппированных строк
+    (product_id, возраст в днях, количество). product_ids отсортированы.
+    """
+    matrix = np.zeros((len(product_ids), days), dtype=np.float64)
+    if len(movement_pids) == 0:
+        return matrix
+    rows = np.searchsorted(product_ids, movement_pids)
+    rows = np.minimum(rows, len(product_ids) - 1)
+    known = (product_ids[rows] == movement_pids) & (movement_ages >= 0) & (movement_ages < days)
+    np.add.at(matrix, (rows[known], movement_ages[known]), movement_qty[known])
+    return matrix
+
+
+def compute_suggestions(
+    product_ids: np.ndarray,
+    stock: np.ndarray,
+    on_order: np.ndarray,
+    lead_days: np.ndarray,
+    movement_pids: np.ndarray,
+    movement_ages: np.ndarray,
+    movement_qty: np.ndarray,
+    windows: Sequence[int] = VELOCITY_WINDOWS,
+    safety_days: float = SAFETY_DAYS,
+    review_days: float = REVIEW_DAYS,
+) -> Suggestions:
+    """
+    Скорость расхода — среднее по окнам средних дневных продаж (короткое окно
+    быстрее реагирует на рост спроса, длинное сглаживает всплески).
+    Заказ нужен, когда остаток вместе с уже заказанным не покрывает расход
+    на срок поставки + страховой запас; заказывается до покрытия ещё и
+    периода проверки. Все массивы выровнены по отсортированным product_ids.
+    """
+    windows = sorted(set(windows))
+    matrix = daily_matrix(product_ids, movement_pids, movement_ages, movement_qty, windows[-1])
+    cumulative = np.cumsum(matrix, axis=1)
+    velocity = np.mean([cumulative[:, w - 1] / w for w in windows], axis=0)
+
+    available = stock + on_order
+    reorder_point = velocity * (lead_days + safety_days)
+    target = velocity * (lead_days + safety_days + review_days)
+    quantity = np.where(
+        (velocity > 0) & (available <= reorder_point),
+        np.ceil(np.maximum(target - available, 0)),
+        0
+    ).astype(np.int64)
+    return Suggestions(product_ids, velocity, reorder_point, quantity)
+
+
+def _catalog(db: Session, supplier_id: Optional[int] = None):
+    """Активные товары с поставщиком: остаток с учётом несвёрнутых шардов"""
+    current, shards = current_stock()
+    query = (
+        select(Product.product_id, Product.product_name, Product.supplier_id, current)
+        .outerjoin(shards, shards.c.product_id == Product.product_id)
+        .where(Product.is_active == True, Product.supplier_id.is_not(None))
+        .order_by(Product.product_id)
+    )
+    if supplier_id is not None:
+        query = query.where(Product.supplier_id == supplier_id)
+    return db.execute(query).all()
+
+
+def _outgoing_by_day(db: Session, days: int):
+    """Расход по товарам и дням за последние days дней (group by в БД)"""
+    day = cast(StockMovement.movement_date, Date)
+    since = date.today() - timedelta(days=days - 1)
+    return db.execute(
+        select(StockMovement.product_id, (date.today() - day).label("age"), func.sum(StockMovement.quantity))
+        .where(StockMovement.movement_type == "outgoing", StockMovement.movement_date >= since)
+        .group_by(StockMovement.product_id, day)
+    ).all()
+
+
+def _on_order(db: Session) -> Dict[int, int]:
+    """Заказано, но ещё не принято (открытые закупки)"""
+    return dict(db.execute(
+        select(PurchaseItem.product_id, func.sum(PurchaseItem.quantity - PurchaseItem.received_quantity))
+        .join(Purchase, Purchase.purchase_id == PurchaseItem.purchase_id)
+        .where(Purchase.status == "ordered")
+        .group_by(PurchaseItem.product_id)
+    ).all())
+
+
+def supplier_lead_times(db: Session) -> Dict[int, float]:
+    """Средний срок поставки (дней) по доставленным закупкам поставщика"""
+    return {
+        supplier_id: float(days)
+        for supplier_id, days in db.execute(
+            select(Purchase.supplier_id, cast(func.avg(Purchase.delivery_date - Purchase.purchase_date), Float))
+            .where(Purchase.status == "delivered", Purchase.delivery_date.is_not(None))
+            .group_by(Purchase.supplier_id)
+        ).all()
+        if days is not None
+    }
+
+
+def _last_purchase_prices(db: Session, product_ids: List[int]) -> Dict[int, float]:
+    """Цена из последней закупки каждого товара"""
+    if not product_ids:
+        return {}
+    return {
+        product_id: float(price)
+        for product_id, price in db.execute(
+            select(PurchaseItem.product_id, PurchaseItem.unit_price)
+            .join(Purchase, Purchase.purchase_id == PurchaseItem.purchase_id)
+            .where(PurchaseItem.product_id.in_(product_ids), Purchase.status != "cancelled")
+            .distinct(PurchaseItem.product_id)
+            .order_by(PurchaseItem.product_id, Purchase.purchase_date.desc(), PurchaseItem.purchase_item_id.desc())
+        ).all()
+    }
+
+
+def draft_purchases(
+    db: Session,
+    windows: Sequence[int] = VELOCITY_WINDOWS,
+    safety_days: float = SAFETY_DAYS,
+    review_days: float = REVIEW_DAYS,
+    supplier_id: Optional[int] = None,
+) -> List[dict]:
+    """
+    Черновики закупок, сгруппированные по поставщикам. Позиции совместимы
+    с телом POST /api/purchases/ (product_id, quantity, unit_price);
+    unit_price — цена последней закупки товара (None, если закупок не было).
+    """
+    catalog = _catalog(db, supplier_id)
+    if not catalog:
+        return []
+
+    windows = sorted(set(windows))
+    movements = _outgoing_by_day(db, windows[-1])
+    on_order = _on_order(db)
+    lead_times = supplier_lead_times(db)
+
+    product_ids = np.array([row[0] for row in catalog], dtype=np.int64)
+    suppliers = np.array([row[2] for row in catalog], dtype=np.int64)
+    stock = np.array([row[3] for row in catalog], dtype=np.float64)
+    ordered = np.array([on_order.get(pid, 0) for pid in product_ids.tolist()], dtype=np.float64)
+    lead_days = np.array(
+        [lead_times.get(s, DEFAULT_LEAD_TIME_DAYS) for s in suppliers.tolist()], dtype=np.float64
+    )
+    movement_pids = np.array([m[0] for m in movements], dtype=np.int64)
+    movement_ages = np.array([m[1] for m in movements], dtype=np.int64)
+    movement_qty = np.array([m[2] for m in movements], dtype=np.float64)
+
+    result = compute_suggestions(
+        product_ids, stock, ordered, lead_days,
+        movement_pids, movement_ages, movement_qty,
+        windows, safety_days, review_days
+    )
+
+    selected = np.flatnonzero(result.quantity > 0)
+    prices = _last_purchase_prices(db, product_ids[selected].tolist())
+    supplier_names = dict(db.execute(
+        select(Supplier.supplier_id, Supplier.company_name)
+        .where(Supplier.supplier_id.in_(sorted(set(suppliers[selected].tolist()))))
+    ).all())
+
+    drafts: Dict[int, dict] = {}
+    for i in selected.tolist():
+        product_id, name, supplier, current = catalog[i]
+        draft = drafts.setdefault(supplier, {
+            "supplier_id": supplier,
+            "supplier_name": supplier_names.get(supplier),
+            "lead_time_days": round(float(lead_days[i]), 1),
+            "total_amount": 0.0,
+            "items": [],
+        })
+        quantity = int(result.quantity[i])
+        price = prices.get(product_id)
+        draft["items"].append({
+            "product_id": product_id,
+            "product_name": name,
+            "quantity": quantity,
+            "unit_price": price,
+            "stock": int(current),
+            "on_order": int(ordered[i]),
+            "daily_velocity": round(float(result.velocity[i]), 3),
+            "reorder_point": math.ceil(result.reorder_point[i]),
+        })
+        if price is not None:
+            draft["total_amount"] = round(draft["total_amount"] + quantity * price, 2)
+    return sorted(drafts.values(), key=lambda d: d["supplier_id"])
+
+
+if __name__ == "__main__":
+    # Пакетный расчёт по всему каталогу: python -m core.replenishment [--windows 7,30,90] [--output файл.json]
+    import argparse
+    import json
+    import time
+
+    from models.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Черновики закупок по скорости расхода")
+    parser.add_argument("--output", help="куда записать черновики (JSON); по умолчанию — только сводка")
+    parser.add_argument("--safety-days", type=float, default=SAFETY_DAYS)
+    parser.add_argument("--review-days", type=float, default=REVIEW_DAYS)
+    parser.add_argument(
+        "--windows", default=",".join(map(str, VELOCITY_WINDOWS)),
+        help="окна расхода в днях через запятую (по умолчанию %(default)s)"
+    )
+    args = parser.parse_args()
+    try:
+        windows = [int(w) for w in args.windows.split(",")]
+    except ValueError:
+        parser.error("--windows: целые числа дней через запятую")
+    if not all(1 <= w <= MAX_WINDOW_DAYS for w in windows):
+        parser.error(f"--windows: окна от 1 до {MAX_WINDOW_DAYS} дней")
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        drafts = draft_purchases(db, windows, safety_days=args.safety_days, review_days=args.review_days)
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"generated_at": date.today().isoformat(), "drafts": drafts}, f, ensure_ascii=False, indent=2)
+    lines = sum(len(d["items"]) for d in drafts)
+    print(f"Черновиков закупок: {len(drafts)}, позиций: {lines}, расчёт {elapsed:.2f} с")
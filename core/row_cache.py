@@ -0,0 +1,110 @@
+# core/row_cache.py — Кэш компактных JSON-массивов строк в памяти процесса (с версиями)
+import gzip
+import hashlib
+import json
+import threading
+import time
+from typing import Callable, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from models.database import SessionLocal
+
+
+def _json(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class CachedRows:
+    """
+    Результат запроса в виде готового JSON-массива массивов ([[1, "Иван"], ...]).
+
+    Пересобирается, только если версия сменилась (invalidate() после записи
+    в этом процессе) или истёк ttl — страховка от изменений, сделанных
+    другими процессами или триггерами в БД.
+    """
+
+    def __init__(self, name: str, query: Callable[[Session], Sequence[tuple]], ttl: float):
+        self.name = name
+        self._query = query
+        self._ttl = ttl
+        self._version = 0
+        self._builds = 0
+        # (версия, срок годности, номер сборки, JSON)
+        self._built: Optional[Tuple[int, float, int, bytes]] = None
+        self._lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._version += 1
+
+    def get(self) -> Tuple[int, bytes]:
+        """
+        (номер сборки, JSON); при необходимости пересобирает в отдельной сессии.
+        Номер сборки меняется при каждой пересборке.
+        """
+        with self._lock:
+            built = self._built
+            if built and built[0] == self._version and built[1] > time.monotonic():
+                return built[2], built[3]
+            version = self._version
+
+        db = SessionLocal()
+        try:
+            rows = self._query(db)
+        finally:
+            db.close()
+        body = _json([list(row) for row in rows])
+
+        with self._lock:
+            self._builds += 1
+            # Если за время сборки пришёл invalidate(), результат уже устарел:
+            # отдаём его этому запросу, но не кэшируем
+            if version == self._version:
+                self._built = (version, time.monotonic() + self._ttl, self._builds, body)
+            return self._builds, body
+
+
+class CachedPayload:
+    """
+    JSON-объект из нескольких CachedRows: {"имя": [[...], ...], ...}.
+    Тело, его gzip и ETag собираются заново только при пересборке частей.
+    """
+
+    def __init__(self, *parts: CachedRows, **extra):
+        self._parts = parts
+        self._extra = extra
+        self._built: Optional[tuple] = None
+        self._gzipped: Optional[tuple] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Tuple[str, bytes]:
+        """(ETag, JSON)"""
+        builds, bodies = zip(*(part.get() for part in self._parts))
+        with self._lock:
+            if self._built and self._built[0] == builds:
+                return self._built[1], self._built[2]
+
+        fields = [
+            _json(key) + b":" + _json(value) for key, value in self._extra.items()
+        ] + [
+            _json(part.name) + b":" + body for part, body in zip(self._parts, bodies)
+        ]
+        payload = b"{" + b",".join(fields) + b"}"
+        etag = '"' + hashlib.blake2b(payload, digest_size=16).hexdigest() + '"'
+
+        with self._lock:
+            self._built = (builds, etag, payload)
+        return etag, payload
+
+    def get_gzip(self) -> Tuple[str, bytes]:
+        """(ETag, gzip(JSON)) — сжимается один раз на версию"""
+        etag, payload = self.get()
+        etag = etag[:-1] + '-gzip"'  # у другого представления — другой ETag
+        with self._lock:
+            if self._gzipped and self._gzipped[0] == etag:
+                return etag, self._gzipped[1]
+        compressed = gzip.compress(payload, compresslevel=6, mtime=0)
+        with self._lock:
+            self._gzipped = (etag, compressed)
+        return etag, compressed
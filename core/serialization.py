@@ -0,0 +1,97 @@
+# core/serialization.py — Быстрая сериализация строк выборки в JSON
+from decimal import Decimal
+from typing import Any, Iterable, Optional, Sequence, get_type_hints
+
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+from sqlalchemy import Float, Numeric, select
+
+_any_adapter = TypeAdapter(Any)
+
+
+def json_response(payload: Any, headers: Optional[dict] = None) -> Response:
+    """JSON-ответ для произвольной структуры (dict/list/datetime) без jsonable_encoder"""
+    return Response(content=_any_adapter.dump_json(payload), media_type="application/json", headers=headers)
+
+
+class RowSerializer:
+    """
+    Проекция колонок + заранее скомпилированный JSON-сериализатор.
+
+    Описание строки задаётся через TypedDict: имена его полей — это
+    имена колонок в ответе. Колонки ищутся в переданных моделях по имени,
+    либо явно передаются через именованные аргументы (для join'ов).
+    Строки сериализуются без ORM-объектов и без повторной валидации Pydantic.
+
+    DECIMAL-колонки читаются как Decimal: в ответах API они отдаются
+    числами (float), а в выгрузках (dump_ndjson, CSV) — точными строками,
+    без двоичного округления денежных сумм.
+
+    Пример:
+        serializer = RowSerializer(PaymentRow, Payment, employee_name=Employee.full_name)
+        rows = db.execute(serializer.select().join(...)).all()
+        return serializer.response(rows)
+    """
+
+    def __init__(self, row_type: type, *models: Any, **columns: Any):
+        self.row_type = row_type
+        self.fields = tuple(get_type_hints(row_type))
+        self.columns = [
+            (columns[name] if name in columns else self._find(name, models)).label(name)
+            for name in self.fields
+        ]
+        self._decimal_fields = tuple(
+            index for index, column in enumerate(self.columns)
+            if isinstance(column.type, Numeric) and not isinstance(column.type, Float)
+        )
+        self._adapter = TypeAdapter(list[row_type])
+
+    @staticmethod
+    def _find(name: str, models: Sequence[Any]):
+        for model in models:
+            if hasattr(model, name):
+                return getattr(model, name)
+        raise AttributeError(f"Колонка '{name}' не найдена ни в одной из моделей")
+
+    def select(self):
+        """select() только по нужным колонкам"""
+        return select(*self.columns)
+
+    def to_dicts(self, rows: Iterable[Sequence[Any]]) -> list[dict]:
+        """Строки для ответа API (Decimal -> float)"""
+        fields = self.fields
+        if not self._decimal_fields:
+            return [dict(zip(fields, row)) for row in rows]
+        result = []
+        for row in rows:
+            data = dict(zip(fields, row))
+            for index in self._decimal_fields:
+                value = row[index]
+                if value is not None:
+                    data[fields[index]] = float(value)
+            result.append(data)
+        return result
+
+    def object_dict(self, obj: Any) -> dict:
+        """Те же поля из ORM-объекта (Decimal -> float, как при выборке колонок)"""
+        result = {}
+        for name in self.fields:
+            value = getattr(obj, name)
+            result[name] = float(value) if isinstance(value, Decimal) else value
+        return result
+
+    def dump_json(self, rows: Iterable[Sequence[Any]]) -> bytes:
+        """Сериализует список строк (кортежей) в JSON-массив"""
+        return self._adapter.dump_json(self.to_dicts(rows))
+
+    def dump_ndjson(self, rows: Iterable[Sequence[Any]]) -> bytes:
+        """
+        Сериализует строки в NDJSON (один JSON-объект на строку) для выгрузок:
+        Decimal — точной строкой ("199.90"), а не float
+        """
+        fields = self.fields
+        dump = _any_adapter.dump_json
+        return b"".join(dump(dict(zip(fields, row))) + b"\n" for row in rows)
+
+    def response(self, rows: Iterable[Sequence[Any]], headers: Optional[dict] = None) -> Response:
+        return Response(content=self.dump_json(rows), media_type="application/json", headers=headers)
@@ -0,0 +1,259 @@
+# core/stock.py — Агрегированное обновление остатков и шардированные счётчики для "горячих" товаров
+import random
+from contextlib import contextmanager
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import bindparam, case, func, insert, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models.tables import Product, StockMovement, StockCounterShard
+
+# Знак изменения остатка по типу движения (как в триггере update_stock_quantity;
+# adjustment остаток не меняет)
+MOVEMENT_SIGN = {"incoming": 1, "outgoing": -1}
+
+# То же изменение остатка движением в SQL — для сумм по журналу
+SIGNED_QUANTITY = case(
+    *[(StockMovement.movement_type == movement_type, sign * StockMovement.quantity)
+      for movement_type, sign in MOVEMENT_SIGN.items()],
+    else_=0
+)
+
+# reference_type поправок, которые пишет сверка остатков (core.stock_reconcile)
+RECONCILIATION_REFERENCE = "reconciliation"
+
+# Остаток по журналу: поправка сверки (adjustment с reference_type
+# RECONCILIATION_REFERENCE) считается со своим знаком; прочие adjustment,
+# как и в триггере, остаток не меняют
+LEDGER_QUANTITY = case(
+    (
+        (StockMovement.movement_type == "adjustment")
+        & (StockMovement.reference_type == RECONCILIATION_REFERENCE),
+        StockMovement.quantity
+    ),
+    else_=SIGNED_QUANTITY
+)
+
+
+class InsufficientStock(ValueError):
+    """Остаток товара после списания стал бы отрицательным"""
+
+    def __init__(self, product_ids: List[int]):
+        self.product_ids = product_ids
+        super().__init__(f"Недостаточно товара {', '.join(map(str, product_ids))} на складе")
+
+
+@contextmanager
+def stock_trigger_deferred(db: Session):
+    """
+    Отключает триггер update_stock_quantity на время блока: после блока
+    триггер снова работает для остальных вставок этой транзакции. Остатки
+    по движениям, вставленным в блоке, обязан применить вызывающий код
+    (apply_stock_deltas). Настройка локальна для транзакции, поэтому при
+    ошибке в блоке её откатывает сам откат транзакции.
+    """
+    db.execute(text("SELECT set_config('app.stock_deferred', 'on', true)"))
+    yield
+    db.execute(text("SELECT set_config('app.stock_deferred', 'off', true)"))
+
+
+def aggregate_deltas(movements: Iterable[dict]) -> Dict[int, int]:
+    """Суммирует изменения остатков по товарам"""
+    deltas = defaultdict(int)
+    for m in movements:
+        sign = MOVEMENT_SIGN.get(m["movement_type"], 0)
+        if sign:
+            deltas[m["product_id"]] += sign * m["quantity"]
+    return {product_id: delta for product_id, delta in deltas.items() if delta}
+
+
+def current_stock():
+    """
+    Текущий остаток с учётом несвёрнутых шардов: (выражение, подзапрос шардов).
+    Подзапрос нужно присоединить: .outerjoin(shards, shards.c.product_id == Product.product_id)
+    """
+    shards = (
+        select(StockCounterShard.product_id, func.sum(StockCounterShard.delta).label("delta"))
+        .group_by(StockCounterShard.product_id)
+        .subquery("shards")
+    )
+    return func.coalesce(Product.stock_quantity, 0) + func.coalesce(shards.c.delta, 0), shards
+
+
+def _hot_products(db: Session, product_ids: Iterable[int]) -> Dict[int, int]:
+    """product_id -> число шардов для товаров в режиме шардированного счётчика"""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return {}
+    return dict(db.execute(
+        select(Product.product_id, Product.stock_shards)
+        .where(Product.product_id.in_(product_ids), Product.stock_shards > 0)
+    ).all())
+
+
+def apply_stock_deltas(db: Session, deltas: Dict[int, int]) -> None:
+    """
+    Применяет изменения остатков: один UPDATE на товар, строго в порядке
+    product_id, чтобы параллельные транзакции блокировали строки
+    в одинаковом порядке и не попадали в deadlock.
+
+    Для "горячих" товаров (stock_shards > 0) строка product не трогается:
+    изменение добавляется в случайный шард stock_counter_shard и позже
+    сворачивается в product.stock_quantity функцией fold_stock_shards().
+    Если после списания остаток "горячего" товара (с учётом шардов) ушёл
+    в минус — InsufficientStock; транзакцию откатывает вызывающий код.
+    """
+    if not deltas:
+        return
+
+    hot = _hot_products(db, deltas)
+    regular = [
+        {"pid": product_id, "delta": deltas[product_id]}
+        for product_id in sorted(deltas)
+        if product_id not in hot
+    ]
+    if regular:
+        product = Product.__table__
+        db.execute(
+            update(product)
+            .where(product.c.product_id == bindparam("pid"))
+            .values(stock_quantity=product.c.stock_quantity + bindparam("delta")),
+            regular
+        )
+
+    for product_id in sorted(hot):
+        statement = pg_insert(StockCounterShard).values(
+            product_id=product_id,
+            shard=random.randrange(hot[product_id]),
+            delta=deltas[product_id]
+        )
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[StockCounterShard.product_id, StockCounterShard.shard],
+            set_={"delta": StockCounterShard.delta + statement.excluded.delta}
+        ))
+
+    # У "горячих" товаров CHECK stock_quantity >= 0 не срабатывает (изменение
+    # лежит в шарде), поэтому остаток после списания проверяется явно
+    written_off = [product_id for product_id in sorted(hot) if deltas[product_id] < 0]
+    if written_off:
+        negative = db.scalars(
+            select(Product.product_id)
+            .join(StockCounterShard, StockCounterShard.product_id == Product.product_id)
+            .where(Product.product_id.in_(written_off))
+            .group_by(Product.product_id, Product.stock_quantity)
+            .having(Product.stock_quantity + func.sum(StockCounterShard.delta) < 0)
+        ).all()
+        if negative:
+            raise InsufficientStock(list(negative))
+
+
+def insert_movements(db: Session, movements: List[dict]) -> None:
+    """
+    Вставляет движения одним многострочным INSERT и применяет остатки
+    агрегированно (вместо построчного срабатывания триггера).
+    """
+    if not movements:
+        return
+    with stock_trigger_deferred(db):
+        db.execute(insert(StockMovement), movements)
+    apply_stock_deltas(db, aggregate_deltas(movements))
+
+
+def read_available_stock(db: Session, product_ids: Iterable[int]) -> Dict[int, int]:
+    """
+    Доступный остаток активных товаров с учётом несвёрнутых шардов.
+
+    Обычные товары блокируются (FOR UPDATE, по порядку product_id) до конца
+    транзакции. "Горячие" товары читаются без блокировки — это и снимает
+    очередь на одной строке; остаток для них перепроверяется после записи
+    шарда (apply_stock_deltas). Эта проверка видит только зафиксированные
+    чужие списания: два параллельных заказа, ещё не зафиксированных,
+    могут вместе уйти в минус на величину одного из них — это цена режима
+    шардов, включаемого для товара явно (stock_shards > 0).
+    """
+    product_ids = sorted(set(product_ids))
+    if not product_ids:
+        return {}
+
+    hot = _hot_products(db, product_ids)
+    stock = dict(db.execute(
+        select(Product.product_id, Product.stock_quantity)
+        .where(
+            Product.product_id.in_([pid for pid in product_ids if pid not in hot]),
+            Product.is_active == True
+        )
+        .order_by(Product.product_id)
+        .with_for_update()
+    ).all())
+
+    if hot:
+        stock.update(db.execute(
+            select(
+                Product.product_id,
+                Product.stock_quantity + func.coalesce(func.sum(StockCounterShard.delta), 0)
+            )
+            .outerjoin(StockCounterShard, StockCounterShard.product_id == Product.product_id)
+            .where(Product.product_id.in_(list(hot)), Product.is_active == True)
+            .group_by(Product.product_id, Product.stock_quantity)
+        ).all())
+    return stock
+
+
+# Свёртка шардов одного товара: сумма удалённых шардов — в stock_quantity
+_FOLD_PRODUCT_SHARDS = text("""
+    WITH drained AS (
+        DELETE FROM stock_counter_shard
+        WHERE product_id = :product_id
+        RETURNING delta
+    )
+    UPDATE product
+    SET stock_quantity = stock_quantity + (SELECT COALESCE(SUM(delta), 0) FROM drained)
+    WHERE product_id = :product_id
+""")
+
+
+def fold_product_shards(db: Session, product_id: int) -> None:
+    """
+    Сворачивает шарды одного товара в product.stock_quantity (без коммита).
+    Если остаток ушёл бы в минус, CHECK stock_quantity >= 0 поднимет
+    IntegrityError, и шарды останутся на месте.
+    """
+    db.execute(_FOLD_PRODUCT_SHARDS, {"product_id": product_id})
+
+
+def fold_stock_shards(db: Session) -> Tuple[int, List[int]]:
+    """
+    Сворачивает накопленные шарды в product.stock_quantity, каждый товар —
+    в своей точке сохранения: товар с отрицательным итогом не срывает
+    свёртку остальных. Возвращает (число свёрнутых товаров, product_id
+    товаров, которые свернуть не удалось). Запускается периодически.
+    """
+    product_ids = db.scalars(
+        select(StockCounterShard.product_id).distinct().order_by(StockCounterShard.product_id)
+    ).all()
+    failed = []
+    for product_id in product_ids:
+        try:
+            with db.begin_nested():
+                fold_product_shards(db, product_id)
+        except IntegrityError:
+            failed.append(product_id)
+    db.commit()
+    return len(product_ids) - len(failed), failed
+
+
+if __name__ == "__main__":
+    # Периодическая задача: python -m core.stock
+    from models.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        folded, failed = fold_stock_shards(db)
+        print(f"Свёрнуто шардов остатков: {folded} товаров")
+        if failed:
+            print(f"Не свёрнуто (остаток ушёл бы в минус): {', '.join(map(str, failed))}")
+    finally:
+        db.close()
@@ -0,0 +1,215 @@
+# core/stock_reconcile.py — Сверка остатков товаров с журналом движений
+#
+# product.stock_quantity расходится с журналом: update_product отключает
+# триггеры (session_replication_role), а остаток можно поправить напрямую
+# через ProductUpdate. Сверка пересчитывает остаток по stock_movement
+# (LEDGER_QUANTITY) пачками товаров по диапазонам product_id — пачки
+# считаются параллельно, каждая своим запросом в своей сессии.
+#
+# С исправлением (fix) на каждое расхождение пишется движение adjustment
+# (reference_type = 'reconciliation') на величину расхождения: журнал
+# приводится к фактическому остатку, сам остаток (как и триггер для
+# adjustment) не меняется. Прочие adjustment в сверке не учитываются.
+# Пачка с расхождениями исправляется под advisory-блокировкой сверки
+# (одновременно исправляется одна пачка — и в одном запуске, и между
+# запусками) и с блокировкой строк товаров и их шардов: расхождение
+# пересчитывается в той же транзакции, где пишутся поправки, поэтому
+# параллельный заказ или вторая сверка не приводят к двойной поправке.
+#
+# Настройки (переменные окружения):
+#   RECONCILE_WORKERS — число параллельных запросов (по умолчанию 4)
+#
+# Запуск: python -m core.stock_reconcile [--fix --employee-id N] [--from ID --to ID] [--output drift.csv]
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from models.database import SessionLocal
+from models.tables import Product, StockCounterShard, StockMovement
+from core.stock import LEDGER_QUANTITY, RECONCILIATION_REFERENCE, current_stock
+
+RECONCILE_WORKERS = int(os.getenv("RECONCILE_WORKERS", 4))
+# Товаров в одной пачке (диапазон product_id)
+RECONCILE_BATCH_SIZE = 1000
+# Наибольший диапазон product_id для исправления через HTTP (POST /reconciliation)
+RECONCILE_FIX_MAX_PRODUCTS = 10_000
+# Ключ pg_advisory_xact_lock для исправления расхождений
+RECONCILE_LOCK_KEY = 0x5EC0
+
+
+def product_batches(
+    db: Session,
+    batch_size: int = RECONCILE_BATCH_SIZE,
+    product_from: Optional[int] = None,
+    product_to: Optional[int] = None,
+) -> List[Tuple[int, int]]:
+    """Диапазоны product_id (включительно) примерно по batch_size товаров"""
+    query = select(Product.product_id).order_by(Product.product_id)
+    if product_from is not None:
+        query = query.where(Product.product_id >= product_from)
+    if product_to is not None:
+        query = query.where(Product.product_id <= product_to)
+    product_ids = db.scalars(query).all()
+    return [
+        (product_ids[start], product_ids[min(start + batch_size, len(product_ids)) - 1])
+        for start in range(0, len(product_ids), batch_size)
+    ]
+
+
+def _drift_query(first: int, last: int):
+    current, shards = current_stock()
+    ledger = (
+        select(StockMovement.product_id, func.sum(LEDGER_QUANTITY).label("quantity"))
+        .where(StockMovement.product_id.between(first, last))
+        .group_by(StockMovement.product_id)
+        .subquery("ledger")
+    )
+    ledger_quantity = func.coalesce(ledger.c.quantity, 0)
+    return (
+        select(Product.product_id, Product.product_name, current, ledger_quantity)
+        .outerjoin(shards, shards.c.product_id == Product.product_id)
+        .outerjoin(ledger, ledger.c.product_id == Product.product_id)
+        .where(Product.product_id.between(first, last), current != ledger_quantity)
+    )
+
+
+def _read_drift(db: Session, first: int, last: int) -> List[dict]:
+    return [
+        {
+            "product_id": product_id,
+            "product_name": name,
+            "stock_quantity": int(stored),
+            "ledger_quantity": int(ledger),
+            "drift": int(stored - ledger),
+        }
+        for product_id, name, stored, ledger in db.execute(_drift_query(first, last)).all()
+    ]
+
+
+def _lock_batch(db: Session, first: int, last: int) -> None:
+    """
+    Блокировки для исправления пачки first..last (до конца транзакции):
+    advisory-блокировка сверки, затем строки товаров и их шардов по порядку
+    product_id — заказы по этим товарам ждут записи поправок.
+    """
+    db.execute(select(func.pg_advisory_xact_lock(RECONCILE_LOCK_KEY)))
+    db.execute(
+        select(Product.product_id)
+        .where(Product.product_id.between(first, last))
+        .order_by(Product.product_id)
+        .with_for_update()
+    )
+    db.execute(
+        select(StockCounterShard.product_id)
+        .where(StockCounterShard.product_id.between(first, last))
+        .order_by(StockCounterShard.product_id, StockCounterShard.shard)
+        .with_for_update()
+    )
+
+
+def reconcile_batch(first: int, last: int, fix_employee_id: Optional[int] = None) -> Tuple[int, List[dict]]:
+    """
+    Сверяет товары first..last: (число товаров, расхождения). Остаток
+    и журнал читаются одним запросом, то есть из одного снимка данных.
+    При исправлении расхождения пачки пересчитываются под блокировками
+    (_lock_batch) и поправки пишутся в той же транзакции.
+    """
+    db = SessionLocal()
+    try:
+        checked = db.scalar(select(func.count()).where(Product.product_id.between(first, last)))
+        drift = _read_drift(db, first, last)
+        if drift and fix_employee_id is not None:
+            # Первое чтение — без блокировок, чтобы пачки без расхождений
+            # не ждали друг друга; пересчёт после блокировок видит все
+            # зафиксированные к этому моменту заказы и поправки
+            db.rollback()
+            _lock_batch(db, first, last)
+            drift = _read_drift(db, first, last)
+            if drift:
+                db.execute(insert(StockMovement), [
+                    {
+                        "product_id": row["product_id"],
+                        "movement_type": "adjustment",
+                        "quantity": row["drift"],
+                        "reference_type": RECONCILIATION_REFERENCE,
+                        "employee_id": fix_employee_id,
+                        "notes": f"Сверка остатков: {row['stock_quantity']} в товаре, {row['ledger_quantity']} по журналу",
+                    }
+                    for row in drift
+                ])
+            db.commit()
+        return checked, drift
+    finally:
+        db.close()
+
+
+def reconcile_stock(
+    fix_employee_id: Optional[int] = None,
+    workers: int = RECONCILE_WORKERS,
+    batch_size: int = RECONCILE_BATCH_SIZE,
+    product_from: Optional[int] = None,
+    product_to: Optional[int] = None,
+) -> dict:
+    """
+    Сверка каталога (или товаров product_from..product_to): пачки товаров
+    параллельно в пуле из workers потоков (работа — в БД, потоки только
+    ждут ответа). fix_employee_id — записать поправки adjustment от имени
+    этого сотрудника.
+    """
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        batches = product_batches(db, batch_size, product_from, product_to)
+    finally:
+        db.close()
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        results = list(pool.map(lambda batch: reconcile_batch(*batch, fix_employee_id), batches))
+
+    drift = sorted((row for _, rows in results for row in rows), key=lambda row: -abs(row["drift"]))
+    return {
+        "products": sum(checked for checked, _ in results),
+        "drifted": len(drift),
+        "total_drift": sum(abs(row["drift"]) for row in drift),
+        "fixed": fix_employee_id is not None,
+        "batches": len(batches),
+        "workers": workers,
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+        "drift": drift,
+    }
+
+
+if __name__ == "__main__":
+    # Периодическая задача: python -m core.stock_reconcile [--fix --employee-id N] [--from ID --to ID] [--output drift.csv]
+    import argparse
+    import csv
+
+    parser = argparse.ArgumentParser(description="Сверка остатков с журналом движений")
+    parser.add_argument("--fix", action="store_true", help="записать поправки adjustment")
+    parser.add_argument("--employee-id", type=int, help="сотрудник для поправок (обязателен с --fix)")
+    parser.add_argument("--workers", type=int, default=RECONCILE_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=RECONCILE_BATCH_SIZE)
+    parser.add_argument("--from", dest="product_from", type=int, help="первый product_id")
+    parser.add_argument("--to", dest="product_to", type=int, help="последний product_id")
+    parser.add_argument("--output", help="CSV с расхождениями")
+    args = parser.parse_args()
+    if args.fix and args.employee_id is None:
+        parser.error("--fix требует --employee-id")
+
+    report = reconcile_stock(
+        args.employee_id if args.fix else None, args.workers, args.batch_size, args.product_from, args.product_to
+    )
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["product_id", "product_name", "stock_quantity", "ledger_quantity", "drift"])
+            writer.writeheader()
+            writer.writerows(report["drift"])
+    print(
+        f"Товаров: {report['products']}, расхождений: {report['drifted']} "
+        f"(сумма {report['total_drift']}), исправлено: {'да' if report['fixed'] else 'нет'}, "
+        f"{report['batches']} пачек / {report['workers']} потоков, {report['elapsed_seconds']} с"
+    )
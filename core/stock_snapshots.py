@@ -0,0 +1,134 @@
+# core/stock_snapshots.py — Снимки остатков и остаток на произвольную дату
+#
+# Снимок (stock_snapshot) — остаток товара на начало дня. Фоновая задача
+# пишет снимок раз в сутки; ежедневные снимки хранятся SNAPSHOT_KEEP_DAYS
+# дней, снимки на 1-е число месяца — всегда. Остаток на момент t = ближайший
+# предыдущий снимок + движения после него; до первого снимка — текущий
+# остаток минус движения после t. Журнал целиком не суммируется.
+#
+# Запуск (например, cron в начале суток):
+#   python -m core.stock_snapshots [--date ГГГГ-ММ-ДД]
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import case, delete, extract, func, literal, select, true
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from models.tables import Product, StockMovement, StockSnapshot
+from core.stock import SIGNED_QUANTITY, current_stock
+
+# Сколько дней хранить ежедневные снимки (снимки на 1-е число не удаляются)
+SNAPSHOT_KEEP_DAYS = 62
+
+
+def take_snapshot(db: Session, snapshot_date: date) -> int:
+    """
+    Снимок остатков всех товаров на начало snapshot_date одним запросом:
+    текущий остаток минус движения с начала этого дня. Повторный запуск
+    за ту же дату перезаписывает снимок. Возвращает число строк.
+    """
+    current, shards = current_stock()
+    since = datetime.combine(snapshot_date, datetime.min.time())
+    moved = (
+        select(StockMovement.product_id, func.sum(SIGNED_QUANTITY).label("delta"))
+        .where(StockMovement.movement_date >= since)
+        .group_by(StockMovement.product_id)
+        .subquery("moved")
+    )
+    source = (
+        select(Product.product_id, literal(snapshot_date), current - func.coalesce(moved.c.delta, 0))
+        .outerjoin(shards, shards.c.product_id == Product.product_id)
+        .outerjoin(moved, moved.c.product_id == Product.product_id)
+    )
+    statement = pg_insert(StockSnapshot).from_select(["product_id", "snapshot_date", "quantity"], source)
+    statement = statement.on_conflict_do_update(
+        index_elements=[StockSnapshot.product_id, StockSnapshot.snapshot_date],
+        set_={"quantity": statement.excluded.quantity, "created_at": func.now()}
+    )
+    return db.execute(statement).rowcount
+
+
+def prune_snapshots(db: Session, today: date) -> int:
+    """Удаляет старые ежедневные снимки, оставляя снимки на 1-е число месяца"""
+    result = db.execute(
+        delete(StockSnapshot).where(
+            StockSnapshot.snapshot_date < today - timedelta(days=SNAPSHOT_KEEP_DAYS),
+            extract("day", StockSnapshot.snapshot_date) != 1
+        )
+    )
+    return result.rowcount
+
+
+def stock_at(db: Session, at: datetime, product_ids: Optional[Iterable[int]] = None) -> Dict[int, int]:
+    """
+    Остаток товаров (всех или product_ids) на момент at одним запросом:
+    по товару — ближайший снимок не позже at (LATERAL по первичному ключу
+    снимков) и сумма движений от снимка до at (по idx_stock_movement_product_date).
+    """
+    current, shards = current_stock()
+    snapshot = (
+        select(StockSnapshot.snapshot_date, StockSnapshot.quantity)
+        .where(StockSnapshot.product_id == Product.product_id, StockSnapshot.snapshot_date <= at.date())
+        .order_by(StockSnapshot.snapshot_date.desc())
+        .limit(1)
+        .lateral("snapshot")
+    )
+    forward = (
+        select(func.coalesce(func.sum(SIGNED_QUANTITY), 0).label("delta"))
+        .where(
+            StockMovement.product_id == Product.product_id,
+            StockMovement.movement_date >= snapshot.c.snapshot_date,
+            StockMovement.movement_date < at
+        )
+        .lateral("forward")
+    )
+    # Только для товаров без снимка до at: назад от текущего остатка
+    backward = (
+        select(func.coalesce(func.sum(SIGNED_QUANTITY), 0).label("delta"))
+        .where(
+            snapshot.c.snapshot_date.is_(None),
+            StockMovement.product_id == Product.product_id,
+            StockMovement.movement_date >= at
+        )
+        .lateral("backward")
+    )
+    query = (
+        select(
+            Product.product_id,
+            case(
+                (snapshot.c.snapshot_date.is_not(None), snapshot.c.quantity + forward.c.delta),
+                else_=current - backward.c.delta
+            )
+        )
+        .select_from(Product)
+        .outerjoin(shards, shards.c.product_id == Product.product_id)
+        .outerjoin(snapshot, true())
+        .join(forward, true())
+        .join(backward, true())
+        .order_by(Product.product_id)
+    )
+    if product_ids is not None:
+        query = query.where(Product.product_id.in_(list(product_ids)))
+    return dict(db.execute(query).all())
+
+
+if __name__ == "__main__":
+    # Ежедневная задача: python -m core.stock_snapshots [--date ГГГГ-ММ-ДД]
+    import argparse
+
+    from models.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Снимок остатков на начало дня")
+    parser.add_argument("--date", type=date.fromisoformat, default=None, help="дата снимка (по умолчанию — сегодня)")
+    args = parser.parse_args()
+    today = date.today()
+
+    db = SessionLocal()
+    try:
+        written = take_snapshot(db, args.date or today)
+        pruned = prune_snapshots(db, today)
+        db.commit()
+        print(f"Снимок остатков на {args.date or today}: {written} товаров, удалено старых снимков: {pruned}")
+    finally:
+        db.close()
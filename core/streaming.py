@@ -0,0 +1,69 @@
+# core/streaming.py — Потоковая выгрузка больших таблиц (NDJSON / CSV)
+import csv
+import io
+from datetime import date, datetime
+from enum import StrEnum
+from typing import Any, Iterator, Sequence
+
+from models.database import engine
+from core.serialization import RowSerializer
+
+# Сколько строк забирать с серверного курсора за один раз
+EXPORT_CHUNK_SIZE = 2000
+
+
+class ExportFormat(StrEnum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv; charset=utf-8",
+}
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode_csv(rows: Sequence[Sequence[Any]]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([_csv_value(v) for v in row] for row in rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def stream_rows(
+    serializer: RowSerializer,
+    statement,
+    fmt: ExportFormat = ExportFormat.NDJSON,
+    chunk_size: int = EXPORT_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """
+    Генератор байтовых чанков для StreamingResponse.
+
+    Запрос выполняется на серверном курсоре (stream_results), строки
+    забираются порциями по chunk_size и сразу кодируются, поэтому
+    потребление памяти не зависит от размера таблицы.
+    Соединение открывается внутри генератора и живёт ровно столько,
+    сколько идёт выгрузка (сессия запроса к этому моменту уже закрыта).
+    """
+    with engine.connect() as connection:
+        result = connection.execution_options(
+            stream_results=True,
+            max_row_buffer=chunk_size
+        ).execute(statement)
+
+        if fmt == ExportFormat.CSV:
+            yield encode_csv([serializer.fields])
+
+        for rows in result.partitions(chunk_size):
+            if fmt == ExportFormat.CSV:
+                yield encode_csv(rows)
+            else:
+                yield serializer.dump_ndjson(rows)
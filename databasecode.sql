@@ -99,6 +99,7 @@ CREATE TABLE Product (
     supplier_id INT,
     weight DECIMAL(10,3),
     is_active BOOLEAN DEFAULT TRUE,
+    stock_shards INT NOT NULL DEFAULT 0 CHECK (stock_shards BETWEEN 0 AND 64),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     created_by_employee_id INT,
     updated_at TIMESTAMP,
@@ -185,6 +186,7 @@ CREATE TABLE Purchase_Item (
     quantity INT NOT NULL CHECK (quantity > 0),
     unit_price DECIMAL(10,2) NOT NULL CHECK (unit_price > 0),
     total_price DECIMAL(10,2) GENERATED ALWAYS AS (quantity * unit_price) STORED,
+    received_quantity INT NOT NULL DEFAULT 0 CHECK (received_quantity BETWEEN 0 AND quantity),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (purchase_id) REFERENCES Purchase(purchase_id) ON DELETE CASCADE,
     FOREIGN KEY (product_id) REFERENCES Product(product_id),
@@ -210,7 +212,7 @@ CREATE TABLE Stock_Movement (
     product_id INT NOT NULL,
     movement_type VARCHAR(20) NOT NULL CHECK (movement_type IN ('incoming', 'outgoing', 'adjustment')),
     quantity INT NOT NULL,
-    movement_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    movement_date TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     reference_id INT,
     reference_type VARCHAR(20),
     employee_id INT NOT NULL,
@@ -220,6 +222,36 @@ CREATE TABLE Stock_Movement (
     FOREIGN KEY (employee_id) REFERENCES Employee(employee_id)
 );
 
+-- 15a. Шардированные счётчики остатков для "горячих" товаров (Product.stock_shards > 0)
+CREATE TABLE Stock_Counter_Shard (
+    product_id INT NOT NULL,
+    shard INT NOT NULL,
+    delta INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_id, shard),
+    FOREIGN KEY (product_id) REFERENCES Product(product_id)
+);
+
+-- 15b. Ключи идемпотентности POST-запросов (заказы, платежи); хранятся сутки
+CREATE TABLE Idempotency_Key (
+    idempotency_key VARCHAR(100) NOT NULL,
+    scope VARCHAR(50) NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    status_code INT,
+    response_body JSONB,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (idempotency_key, scope)
+);
+
+-- 15c. Снимки остатков на начало дня (ежедневные и на 1-е число месяца)
+CREATE TABLE Stock_Snapshot (
+    product_id INT NOT NULL,
+    snapshot_date DATE NOT NULL,
+    quantity INT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (product_id, snapshot_date),
+    FOREIGN KEY (product_id) REFERENCES Product(product_id)
+);
+
 -- 16. Таблица логов действий пользователей (для аудита)
 CREATE TABLE Audit_Log (
     log_id SERIAL PRIMARY KEY,
@@ -262,15 +294,23 @@ CREATE INDEX idx_orders_employee ON Orders(employee_id);
 CREATE INDEX idx_orders_date ON Orders(order_date);
 CREATE INDEX idx_orders_status ON Orders(status);
 CREATE INDEX idx_orders_code ON Orders(order_code);
+CREATE INDEX idx_orders_unpaid ON Orders(order_date, order_id) WHERE status IN ('Принят', 'В обработке');
 CREATE INDEX idx_payment_order ON Payment(order_id);
 CREATE INDEX idx_payment_status ON Payment(payment_status);
 CREATE INDEX idx_payment_code ON Payment(payment_code);
+CREATE INDEX idx_payment_date ON Payment(payment_date, payment_id);
 CREATE INDEX idx_purchase_supplier ON Purchase(supplier_id);
 CREATE INDEX idx_purchase_employee ON Purchase(employee_id);
 CREATE INDEX idx_purchase_status ON Purchase(status);
 CREATE INDEX idx_purchase_code ON Purchase(purchase_code);
+CREATE INDEX idx_purchase_date ON Purchase(purchase_date, purchase_id);
+CREATE INDEX idx_purchase_item_purchase ON Purchase_Item(purchase_id);
+CREATE INDEX idx_price_history_product_date ON Price_History(product_id, change_date, price_history_id);
 CREATE INDEX idx_stock_movement_product ON Stock_Movement(product_id);
 CREATE INDEX idx_stock_movement_date ON Stock_Movement(movement_date);
+CREATE INDEX idx_stock_movement_product_date ON Stock_Movement(product_id, movement_date, movement_id);
+CREATE INDEX idx_stock_movement_reference ON Stock_Movement(reference_type, reference_id);
+CREATE INDEX idx_idempotency_key_created ON Idempotency_Key(created_at);
 CREATE INDEX idx_audit_log_employee ON Audit_Log(employee_id);
 CREATE INDEX idx_audit_log_created ON Audit_Log(created_at);
 CREATE INDEX idx_user_session_employee ON User_Session(employee_id);
@@ -306,6 +346,10 @@ CREATE TRIGGER update_category_updated_at
 CREATE OR REPLACE FUNCTION update_stock_quantity()
 RETURNS TRIGGER AS $$
 BEGIN
+    -- Приложение применяет остатки само, агрегированно по товарам (core/stock.py)
+    IF current_setting('app.stock_deferred', true) = 'on' THEN
+        RETURN NEW;
+    END IF;
     IF TG_OP = 'INSERT' THEN
         IF NEW.movement_type = 'incoming' THEN
             UPDATE Product SET stock_quantity = stock_quantity + NEW.quantity 
@@ -4,7 +4,7 @@ from .tables import (
     Role, Employee, Permission, RolePermission,
     Category, Customer, Supplier, Product,
     Orders, OrderItem, Payment, Purchase, PurchaseItem,
-    PriceHistory, StockMovement, AuditLog, UserSession
+    PriceHistory, StockMovement, StockCounterShard, StockSnapshot, IdempotencyKey, AuditLog, UserSession
 )
 
 __all__ = [
@@ -12,5 +12,5 @@ __all__ = [
     'Role', 'Employee', 'Permission', 'RolePermission',
     'Category', 'Customer', 'Supplier', 'Product',
     'Orders', 'OrderItem', 'Payment', 'Purchase', 'PurchaseItem',
-    'PriceHistory', 'StockMovement', 'AuditLog', 'UserSession'
+    'PriceHistory', 'StockMovement', 'StockCounterShard', 'StockSnapshot', 'IdempotencyKey', 'AuditLog', 'UserSession'
 ]
\ No newline at end of file
@@ -1,5 +1,5 @@
 # models/tables.py
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Date, ForeignKey, Text, DECIMAL, JSON
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Date, ForeignKey, Text, DECIMAL, JSON, Computed
 from sqlalchemy.dialects.postgresql import INET
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -125,6 +125,7 @@ class Product(Base):
     supplier_id = Column(Integer, ForeignKey("supplier.supplier_id"))
     weight = Column(DECIMAL(10, 3))
     is_active = Column(Boolean, default=True)
+    stock_shards = Column(Integer, nullable=False, server_default="0")  # >0 — "горячий" товар, остаток через stock_counter_shard
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     created_by_employee_id = Column(Integer, ForeignKey("employee.employee_id"))
     updated_at = Column(DateTime(timezone=True))
@@ -148,6 +149,7 @@ class Orders(Base):
     status = Column(String(20), nullable=False)  # Принят, В обработке, Оплачен, Завершен, Отменен
     employee_id = Column(Integer, ForeignKey("employee.employee_id"), nullable=False)
     discount_percent = Column(DECIMAL(5, 2), default=0)
+    final_amount = Column(DECIMAL(10, 2), Computed("total_amount * (1 - discount_percent/100)", persisted=True))
     payment_type = Column(String(20))  # cash, card, online
     notes = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -220,6 +222,7 @@ class PurchaseItem(Base):
     product_id = Column(Integer, ForeignKey("product.product_id"), nullable=False)
     quantity = Column(Integer, nullable=False)
     unit_price = Column(DECIMAL(10, 2), nullable=False)
+    received_quantity = Column(Integer, nullable=False, server_default="0")  # принято на склад
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Связи
@@ -248,7 +251,7 @@ class StockMovement(Base):
     product_id = Column(Integer, ForeignKey("product.product_id"), nullable=False)
     movement_type = Column(String(20), nullable=False)  # incoming, outgoing, adjustment
     quantity = Column(Integer, nullable=False)
-    movement_date = Column(DateTime(timezone=True), server_default=func.now())
+    movement_date = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     reference_id = Column(Integer)
     reference_type = Column(String(20))
     employee_id = Column(Integer, ForeignKey("employee.employee_id"), nullable=False)
@@ -259,6 +262,31 @@ class StockMovement(Base):
     product = relationship("Product")
     employee = relationship("Employee")
 
+class StockCounterShard(Base):
+    __tablename__ = "stock_counter_shard"
+    
+    product_id = Column(Integer, ForeignKey("product.product_id"), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    delta = Column(Integer, nullable=False, default=0)
+
+class StockSnapshot(Base):
+    __tablename__ = "stock_snapshot"
+    
+    product_id = Column(Integer, ForeignKey("product.product_id"), primary_key=True)
+    snapshot_date = Column(Date, primary_key=True)  # остаток на начало дня
+    quantity = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_key"
+    
+    idempotency_key = Column(String(100), primary_key=True)
+    scope = Column(String(50), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer)
+    response_body = Column(JSON)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
 class AuditLog(Base):
     __tablename__ = "audit_log"
     
@@ -6,16 +6,20 @@ from models.database import get_db
 from models.tables import Customer
 from dependencies import require_permission
 from core.permissions import PermissionCode
+from core.serialization import RowSerializer
+from schemas.customer import CustomerRow
+from core.order_form import order_form_customers
 
 router = APIRouter(prefix="/api/customers", tags=["Клиенты"])
 
+customer_rows = RowSerializer(CustomerRow, Customer)
+
 @router.get("/")
 async def get_customers(
     db: Session = Depends(get_db),
     current_user = Depends(require_permission(PermissionCode.CUSTOMERS_VIEW))
 ):
-    customers = db.scalars(select(Customer)).all()
-    return customers
+    return customer_rows.response(db.execute(customer_rows.select()).all())
 
 @router.get("/{customer_id}")
 async def get_customer(
@@ -45,6 +49,7 @@ async def create_customer(
     
     db.add(customer)
     db.commit()
+    order_form_customers.invalidate()
     db.refresh(customer)
     return customer
 
@@ -64,6 +69,7 @@ async def update_customer(
             setattr(customer, key, value)
     
     db.commit()
+    order_form_customers.invalidate()
     return customer
 
 @router.delete("/{customer_id}")
@@ -78,4 +84,5 @@ async def delete_customer(
     
     db.delete(customer)
     db.commit()
+    order_form_customers.invalidate()
     return {"message": "Клиент удален"}
\ No newline at end of file
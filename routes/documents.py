@@ -0,0 +1,110 @@
+# routes/documents.py
+from enum import StrEnum
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models.database import get_db
+from models.tables import Payment, Purchase
+from dependencies import require_permission
+from core.permissions import PermissionCode
+from core.documents import load_receipts, load_invoices
+from core.pdf import metrics
+from core.pdf_cache import pdf_cache
+from core.pdf_batch import create_job, get_job, stream_zip
+
+router = APIRouter(prefix="/api/documents", tags=["Документы"])
+
+# Не больше документов в одном архиве
+ZIP_EXPORT_LIMIT = 5000
+
+
+class DocumentKind(StrEnum):
+    RECEIPTS = "receipts"
+    INVOICES = "invoices"
+
+
+# вид -> (вид вёрстки, загрузчик, id, дата для фильтра, имя файла в архиве)
+DOCUMENTS = {
+    DocumentKind.RECEIPTS: (
+        "receipt", load_receipts, Payment.payment_id, Payment.payment_date,
+        lambda doc: f"receipt_{doc['payment_code'] or doc['payment_id']}.pdf"
+    ),
+    DocumentKind.INVOICES: (
+        "invoice", load_invoices, Purchase.purchase_id, Purchase.purchase_date,
+        lambda doc: f"purchase_{doc['purchase_code'] or doc['purchase_id']}.pdf"
+    ),
+}
+
+
+@router.get("/metrics")
+async def get_render_metrics(
+    current_user = Depends(require_permission(PermissionCode.REPORTS_VIEW))
+):
+    """
+    Статистика PDF в этом процессе: вёрстка (количество, средняя/максимальная
+    длительность, ожидание пула) и дисковый кэш (попадания, промахи, вытеснения)
+    """
+    return {**metrics.snapshot(), "cache": pdf_cache.stats()}
+
+
+@router.get("/export/{kind}")
+def export_documents_zip(
+    kind: DocumentKind,
+    ids: Optional[List[int]] = Query(None),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+    current_user = Depends(require_permission(PermissionCode.REPORTS_EXPORT))
+):
+    """
+    Чеки (receipts) или накладные (invoices) одним ZIP-архивом — по списку ids
+    или за период. Архив передаётся потоково, по мере готовности документов.
+    Идентификатор выгрузки — в заголовке X-Export-Job, прогресс —
+    GET /api/documents/jobs/{job_id}. Обработчик синхронный (выбор id —
+    запрос к БД, в пуле потоков); сам архив собирается асинхронно.
+    """
+    pdf_kind, loader, id_column, date_column, filename = DOCUMENTS[kind]
+
+    query = select(id_column).order_by(date_column, id_column)
+    if ids:
+        query = query.where(id_column.in_(ids))
+    if date_from:
+        query = query.where(date_column >= date_from)
+    if date_to:
+        query = query.where(date_column < date_to)
+    if not (ids or date_from or date_to):
+        raise HTTPException(status_code=400, detail="Укажите ids или период (date_from, date_to)")
+
+    doc_ids = db.scalars(query.limit(ZIP_EXPORT_LIMIT + 1)).all()
+    if len(doc_ids) > ZIP_EXPORT_LIMIT:
+        raise HTTPException(status_code=400, detail=f"Не более {ZIP_EXPORT_LIMIT} документов в одном архиве")
+    if not doc_ids:
+        raise HTTPException(status_code=404, detail="Документы не найдены")
+
+    job = create_job(kind.value, len(doc_ids), current_user.employee_id)
+    archive_name = f"{kind.value}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    return StreamingResponse(
+        stream_zip(job, pdf_kind, list(doc_ids), loader, filename),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename={archive_name}",
+            "X-Export-Job": job.job_id
+        }
+    )
+
+
+@router.get("/jobs/{job_id}")
+async def get_export_job(
+    job_id: str,
+    current_user = Depends(require_permission(PermissionCode.REPORTS_EXPORT))
+):
+    """Прогресс выгрузки: сколько документов из total уже в архиве, ошибки"""
+    job = get_job(job_id)
+    if not job or job.employee_id != current_user.employee_id:
+        raise HTTPException(status_code=404, detail="Выгрузка не найдена")
+    return job.as_dict()
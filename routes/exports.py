@@ -0,0 +1,65 @@
+# routes/exports.py
+from enum import StrEnum
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+
+from models.tables import Product, Orders, OrderItem, StockMovement, Payment
+from dependencies import require_permission
+from core.permissions import PermissionCode
+from core.serialization import RowSerializer
+from core.streaming import ExportFormat, MEDIA_TYPES, stream_rows
+from schemas.product import ProductRow
+from schemas.order import OrderRow, OrderItemRow
+from schemas.payment import PaymentRow
+from schemas.stock_movement import StockMovementRow
+
+router = APIRouter(prefix="/api/export", tags=["Экспорт"])
+
+
+class ExportTable(StrEnum):
+    PRODUCTS = "products"
+    ORDERS = "orders"
+    ORDER_ITEMS = "order-items"
+    STOCK_MOVEMENTS = "stock-movements"
+    PAYMENTS = "payments"
+
+
+# таблица -> (сериализатор, колонка сортировки, колонка даты для фильтра)
+EXPORTS = {
+    ExportTable.PRODUCTS: (RowSerializer(ProductRow, Product), Product.product_id, Product.created_at),
+    ExportTable.ORDERS: (RowSerializer(OrderRow, Orders), Orders.order_id, Orders.order_date),
+    ExportTable.ORDER_ITEMS: (RowSerializer(OrderItemRow, OrderItem), OrderItem.order_item_id, OrderItem.created_at),
+    ExportTable.STOCK_MOVEMENTS: (RowSerializer(StockMovementRow, StockMovement), StockMovement.movement_id, StockMovement.movement_date),
+    ExportTable.PAYMENTS: (RowSerializer(PaymentRow, Payment), Payment.payment_id, Payment.payment_date),
+}
+
+
+@router.get("/{table}")
+def export_table(
+    table: ExportTable,
+    format: ExportFormat = ExportFormat.NDJSON,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    current_user = Depends(require_permission(PermissionCode.REPORTS_EXPORT))
+):
+    """
+    Потоковая выгрузка таблицы в NDJSON или CSV.
+    Данные отдаются порциями по мере чтения с серверного курсора.
+    """
+    serializer, order_column, date_column = EXPORTS[table]
+
+    query = serializer.select().order_by(order_column)
+    if date_from:
+        query = query.where(date_column >= date_from)
+    if date_to:
+        query = query.where(date_column < date_to)
+
+    filename = f"{table.value}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format.value}"
+    return StreamingResponse(
+        stream_rows(serializer, query, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
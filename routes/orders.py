@@ -1,34 +1,160 @@
 # routes/orders.py
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Request
+from fastapi.responses import Response
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import select, insert, update, delete, func, text, bindparam
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from models.database import get_db
-from models.tables import Orders, OrderItem, Product, Customer, StockMovement
+from models.tables import Orders, OrderItem, Product, Customer
 from dependencies import require_permission
 from core.permissions import PermissionCode
+from core.serialization import RowSerializer, json_response
+from core.pagination import decode_cursor, keyset, split_page
+from core.stock import InsufficientStock, insert_movements, read_available_stock
+from core.idempotency import IDEMPOTENCY_HEADER, IdempotentRequest
+from core.pricing import fetch_prices, price_items, final_amount
+from core.order_form import order_form, order_form_products
+from schemas.order import OrderRow, OrderItemRow
+from schemas.customer import CustomerRow
+from schemas.product import ProductRow
+from typing import List, Optional
 from datetime import datetime
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 
 router = APIRouter(prefix="/api/orders", tags=["Заказы"])
 
+order_rows = RowSerializer(OrderRow, Orders)
+order_item_rows = RowSerializer(OrderItemRow, OrderItem)
+customer_rows = RowSerializer(CustomerRow, Customer)
+product_rows = RowSerializer(ProductRow, Product)
+
+# Связанные данные, которые можно подгрузить в список заказов (?include=items,customer)
+ORDER_INCLUDES = {
+    "items": Orders.items,
+    "customer": Orders.customer,
+}
+
+def _parse_include(include: Optional[str]) -> List[str]:
+    names = [name.strip() for name in include.split(",") if name.strip()] if include else []
+    unknown = [name for name in names if name not in ORDER_INCLUDES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Неизвестные значения include: {', '.join(unknown)}")
+    return names
+
+def _order_with_related(order: Orders, includes: List[str]) -> dict:
+    data = order_rows.object_dict(order)
+    if "items" in includes:
+        data["items"] = [order_item_rows.object_dict(item) for item in order.items]
+    if "customer" in includes:
+        data["customer"] = customer_rows.object_dict(order.customer) if order.customer else None
+    return data
+
 @router.get("/")
 async def get_orders(
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    status: Optional[str] = None,
+    customer_id: Optional[int] = None,
+    employee_id: Optional[int] = None,
+    include: Optional[str] = Query(None, description="Связанные данные через запятую: items, customer"),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user = Depends(require_permission(PermissionCode.ORDERS_VIEW))
+):
+    """
+    Список заказов, новые сверху, с keyset-пагинацией.
+
+    Курсор следующей страницы возвращается в заголовке X-Next-Cursor.
+    При include=items,customer связанные строки подгружаются через
+    selectinload — по одному дополнительному запросу на связь.
+    """
+    includes = _parse_include(include)
+    if includes:
+        query = select(Orders).options(*[selectinload(ORDER_INCLUDES[name]) for name in includes])
+    else:
+        query = order_rows.select()
+    
+    if date_from:
+        query = query.where(Orders.order_date >= date_from)
+    if date_to:
+        query = query.where(Orders.order_date < date_to)
+    if status:
+        query = query.where(Orders.status == status)
+    if customer_id:
+        query = query.where(Orders.customer_id == customer_id)
+    if employee_id:
+        query = query.where(Orders.employee_id == employee_id)
+    
+    after = decode_cursor(cursor, datetime.fromisoformat, int)
+    query = keyset(query, (Orders.order_date, Orders.order_id), after, limit)
+    
+    if includes:
+        orders, headers = split_page(db.scalars(query).all(), limit, lambda o: (o.order_date, o.order_id))
+        return json_response([_order_with_related(o, includes) for o in orders], headers)
+    
+    rows, headers = split_page(db.execute(query).all(), limit, lambda r: (r.order_date, r.order_id))
+    return order_rows.response(rows, headers)
+
+@router.get("/stats/status")
+async def get_order_status_counts(
     db: Session = Depends(get_db),
     current_user = Depends(require_permission(PermissionCode.ORDERS_VIEW))
 ):
-    orders = db.scalars(select(Orders)).all()
-    return orders
+    """Количество заказов по статусам (для графика на панели управления)"""
+    rows = db.execute(select(Orders.status, func.count()).group_by(Orders.status)).all()
+    return {status: count for status, count in rows}
+
+@router.get("/stats/count")
+async def get_order_count(
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    status: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user = Depends(require_permission(PermissionCode.ORDERS_VIEW))
+):
+    """Количество заказов за период (для счётчиков на панели управления)"""
+    query = select(func.count()).select_from(Orders)
+    if date_from:
+        query = query.where(Orders.order_date >= date_from)
+    if date_to:
+        query = query.where(Orders.order_date < date_to)
+    if status:
+        query = query.where(Orders.status == status)
+    return {"count": db.scalar(query)}
 
 @router.post("/")
 async def create_order(
     order_data: dict,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER, max_length=100),
     db: Session = Depends(get_db),
     current_user = Depends(require_permission(PermissionCode.ORDERS_CREATE))
 ):
+    # Повтор запроса с тем же ключом возвращает сохранённый ответ
+    request = IdempotentRequest(db, idempotency_key, "orders.create", order_data, current_user.employee_id)
+    if request.replay is not None:
+        return request.replay
+    
+    # Позиции оцениваются по ценам каталога (один запрос), сумму считает сервер
+    try:
+        items = _parse_items(order_data.get("items", []))
+        total_amount = price_items(items, fetch_prices(db, (item["product_id"] for item in items)))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Остатки с учётом шардов "горячих" товаров (обычные товары блокируются до коммита)
+    stock = read_available_stock(db, (item["product_id"] for item in items))
+    for item in items:
+        available = stock.get(item["product_id"])
+        if available is None:
+            raise HTTPException(status_code=400, detail=f"Товар {item['product_id']} не найден или неактивен")
+        if available < item["quantity"]:
+            raise HTTPException(status_code=400, detail=f"Недостаточно товара {item['product_id']} на складе")
+
     # Создаем заказ
     order = Orders(
         customer_id=order_data.get("customer_id"),
-        total_amount=Decimal(str(order_data.get("total_amount", 0))),
+        total_amount=total_amount,
         status=order_data.get("status", "Принят"),
         employee_id=current_user.employee_id,
         discount_percent=Decimal(str(order_data.get("discount_percent", 0))),
@@ -39,47 +165,318 @@ async def create_order(
     db.add(order)
     db.flush()  # Получаем ID заказа
     
-    # Добавляем позиции заказа
-    for item in order_data.get("items", []):
-        order_item = OrderItem(
-            order_id=order.order_id,
-            product_id=item["product_id"],
-            quantity=item["quantity"],
-            item_price=Decimal(str(item["item_price"])),
-            item_discount=Decimal(str(item.get("item_discount", 0)))
-        )
-        db.add(order_item)
-        
-        # Создаём запись о движении (триггер БД автоматически обновит stock_quantity)
-        movement = StockMovement(
-            product_id=item["product_id"],
-            movement_type="outgoing",
-            quantity=item["quantity"],
-            reference_id=order.order_id,
-            reference_type="order",
-            employee_id=current_user.employee_id,
-            notes=f"Заказ #{order.order_id}"
-        )
-        db.add(movement)
+    # Позиции и движения — многострочными INSERT
+    movements = [
+        {
+            "product_id": item["product_id"],
+            "movement_type": "outgoing",
+            "quantity": item["quantity"],
+            "reference_id": order.order_id,
+            "reference_type": "order",
+            "employee_id": current_user.employee_id,
+            "notes": f"Заказ #{order.order_id}"
+        }
+        for item in items
+    ]
+    if items:
+        db.execute(insert(OrderItem), [{**item, "order_id": order.order_id} for item in items])
+    
+    # Движения одним INSERT, остатки — по одному UPDATE на товар
+    db.flush()
+    try:
+        insert_movements(db, movements)
+    except InsufficientStock as e:
+        # "Горячий" товар успел уйти параллельным заказом
+        raise HTTPException(status_code=400, detail=str(e))
+    result = {
+        "message": "Заказ создан",
+        "order_id": order.order_id,
+        "total_amount": float(total_amount),
+        "final_amount": float(final_amount(total_amount, order.discount_percent))
+    }
+    request.commit(result)
+    order_form_products.invalidate()
+    return result
+
+# Ограничения пакетного создания заказов
+ORDER_BATCH_LIMIT = 1000
+ORDER_BATCH_CHUNK = 100
+
+ORDER_STATUSES = ("Принят", "В обработке", "Оплачен", "Завершен", "Отменен")
+PAYMENT_TYPES = ("cash", "card", "online")
+
+def _parse_items(items_data: list) -> List[dict]:
+    """
+    Позиции заказа: приведение типов и проверки CHECK/UNIQUE таблицы orders_item.
+    item_price клиента не используется — цену проставляет core.pricing.
+    """
+    try:
+        items = [
+            {
+                "product_id": int(item["product_id"]),
+                "quantity": int(item["quantity"]),
+                "item_discount": Decimal(str(item.get("item_discount", 0)))
+            }
+            for item in items_data
+        ]
+    except (KeyError, TypeError, ValueError, InvalidOperation):
+        raise ValueError("Некорректные данные позиций заказа")
+    
+    product_ids = set()
+    for item in items:
+        if item["quantity"] <= 0 or not (0 <= item["item_discount"] <= 99):
+            raise ValueError(f"Некорректная позиция для товара {item['product_id']}")
+        if item["product_id"] in product_ids:
+            raise ValueError(f"Товар {item['product_id']} указан в заказе несколько раз")
+        product_ids.add(item["product_id"])
+    return items
+
+def _parse_order(order_data: dict) -> dict:
+    """
+    Приводит данные заказа к виду для INSERT и проверяет то,
+    что иначе отклонила бы БД (CHECK/UNIQUE), чтобы одна ошибка
+    не откатывала весь пакет.
+    """
+    try:
+        customer_id = order_data.get("customer_id")
+        order = {
+            "customer_id": int(customer_id) if customer_id is not None else None,
+            "status": order_data.get("status", "Принят"),
+            "discount_percent": Decimal(str(order_data.get("discount_percent", 0))),
+            "payment_type": order_data.get("payment_type"),
+            "notes": order_data.get("notes")
+        }
+    except (TypeError, ValueError, InvalidOperation):
+        raise ValueError("Некорректные данные заказа")
+    
+    if order["status"] not in ORDER_STATUSES:
+        raise ValueError(f"Недопустимый статус заказа: {order['status']}")
+    if order["payment_type"] is not None and order["payment_type"] not in PAYMENT_TYPES:
+        raise ValueError(f"Недопустимый тип оплаты: {order['payment_type']}")
+    if not (0 <= order["discount_percent"] <= 99):
+        raise ValueError("Некорректная скидка заказа")
+    
+    return {"order": order, "items": _parse_items(order_data.get("items", []))}
+
+def _create_orders_chunk(db: Session, chunk: List[tuple], employee_id: int) -> List[dict]:
+    """
+    Создаёт порцию заказов в одной транзакции.
+
+    Остатки всех товаров порции читаются одним запросом с блокировкой
+    (в порядке product_id, чтобы параллельные пакеты не ловили deadlock),
+    существующие клиенты — ещё одним, цены — третьим (core.pricing), затем
+    заказы, позиции и движения вставляются многострочными INSERT, а остатки
+    применяются одним UPDATE на товар. Неизвестный товар, клиент или нехватка
+    остатка дают ошибку только своего заказа.
+    """
+    stock = read_available_stock(
+        db, (item["product_id"] for _, parsed in chunk for item in parsed["items"])
+    )
+    # Иначе неизвестный клиент сорвал бы всю порцию нарушением внешнего ключа
+    customer_ids = {parsed["order"]["customer_id"] for _, parsed in chunk} - {None}
+    customers = set(db.scalars(
+        select(Customer.customer_id).where(Customer.customer_id.in_(customer_ids))
+    ).all()) if customer_ids else set()
+    
+    results = []
+    accepted = []
+    for index, parsed in chunk:
+        error = None
+        customer_id = parsed["order"]["customer_id"]
+        if customer_id is not None and customer_id not in customers:
+            results.append({"index": index, "error": f"Клиент {customer_id} не найден"})
+            continue
+        for item in parsed["items"]:
+            available = stock.get(item["product_id"])
+            if available is None:
+                error = f"Товар {item['product_id']} не найден или неактивен"
+            elif available < item["quantity"]:
+                error = f"Недостаточно товара {item['product_id']} на складе"
+            if error:
+                break
+        if error:
+            results.append({"index": index, "error": error})
+            continue
+        for item in parsed["items"]:
+            stock[item["product_id"]] -= item["quantity"]
+        accepted.append((index, parsed))
+    
+    if not accepted:
+        db.rollback()
+        return results
     
+    # Цены всех товаров порции — одним запросом
+    prices = fetch_prices(db, (item["product_id"] for _, parsed in accepted for item in parsed["items"]))
+    for _, parsed in accepted:
+        parsed["order"]["total_amount"] = price_items(parsed["items"], prices)
+    
+    order_ids = db.scalars(
+        insert(Orders).returning(Orders.order_id, sort_by_parameter_order=True),
+        [{**parsed["order"], "employee_id": employee_id} for _, parsed in accepted]
+    ).all()
+    
+    order_items = []
+    movements = []
+    for order_id, (index, parsed) in zip(order_ids, accepted):
+        for item in parsed["items"]:
+            order_items.append({**item, "order_id": order_id})
+            movements.append({
+                "product_id": item["product_id"],
+                "movement_type": "outgoing",
+                "quantity": item["quantity"],
+                "reference_id": order_id,
+                "reference_type": "order",
+                "employee_id": employee_id,
+                "notes": f"Заказ #{order_id}"
+            })
+        results.append({"index": index, "order_id": order_id})
+    
+    if order_items:
+        db.execute(insert(OrderItem), order_items)
+        insert_movements(db, movements)
     db.commit()
-    return {"message": "Заказ создан", "order_id": order.order_id}
+    return results
+
+def create_orders_batch(db: Session, orders_data: List[dict], employee_id: int, chunk_size: int = ORDER_BATCH_CHUNK) -> List[dict]:
+    """Пакетное создание заказов; возвращает результат по каждому заказу (по индексу)"""
+    results = []
+    parsed_orders = []
+    for index, order_data in enumerate(orders_data):
+        try:
+            parsed_orders.append((index, _parse_order(order_data)))
+        except ValueError as e:
+            results.append({"index": index, "error": str(e)})
+    
+    for start in range(0, len(parsed_orders), chunk_size):
+        chunk = parsed_orders[start:start + chunk_size]
+        try:
+            results.extend(_create_orders_chunk(db, chunk, employee_id))
+        except InsufficientStock as e:
+            db.rollback()
+            results.extend({"index": index, "error": str(e)} for index, _ in chunk)
+        except SQLAlchemyError as e:
+            db.rollback()
+            results.extend({"index": index, "error": f"Ошибка БД: {e.__class__.__name__}"} for index, _ in chunk)
+    
+    results.sort(key=lambda r: r["index"])
+    return results
+
+@router.post("/batch")
+async def create_orders(
+    orders_data: List[dict],
+    db: Session = Depends(get_db),
+    current_user = Depends(require_permission(PermissionCode.ORDERS_CREATE))
+):
+    """
+    Пакетное создание заказов (для интеграций с маркетплейсами).
+    Заказы обрабатываются порциями по ORDER_BATCH_CHUNK в отдельных транзакциях;
+    ошибка в одном заказе не мешает созданию остальных.
+    """
+    if len(orders_data) > ORDER_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"Не более {ORDER_BATCH_LIMIT} заказов за один запрос")
+    
+    results = create_orders_batch(db, orders_data, current_user.employee_id)
+    created = sum(1 for r in results if "order_id" in r)
+    if created:
+        order_form_products.invalidate()
+    return {
+        "created": created,
+        "failed": len(results) - created,
+        "results": results
+    }
 
 @router.get("/customers")
 async def get_customers(
     db: Session = Depends(get_db),
     current_user = Depends(require_permission(PermissionCode.CUSTOMERS_VIEW))
 ):
-    customers = db.scalars(select(Customer)).all()
-    return customers
+    return customer_rows.response(db.execute(customer_rows.select()).all())
 
 @router.get("/products")
 async def get_products_for_order(
     db: Session = Depends(get_db),
     current_user = Depends(require_permission(PermissionCode.PRODUCTS_VIEW))
 ):
-    products = db.scalars(select(Product).where(Product.is_active == True)).all()
-    return products
+    query = product_rows.select().where(Product.is_active == True)
+    return product_rows.response(db.execute(query).all())
+
+@router.get("/bootstrap")
+def get_order_form_data(
+    request: Request,
+    current_user = Depends(require_permission(PermissionCode.ORDERS_VIEW)),
+    # Те же права, что у /customers и /products, которые этот ответ заменяет
+    can_view_customers = Depends(require_permission(PermissionCode.CUSTOMERS_VIEW)),
+    can_view_products = Depends(require_permission(PermissionCode.PRODUCTS_VIEW))
+):
+    """
+    Клиенты и активные товары для формы заказа одним ответом, компактными массивами:
+    {"fields": {...}, "customers": [[id, имя], ...], "products": [[id, название, цена, остаток], ...]}.
+    Ответ берётся из кэша в памяти (core.order_form), поддерживаются ETag и gzip.
+    Синхронный обработчик: при промахе кэш пересобирается запросами к БД
+    в пуле потоков, а не в цикле событий.
+    """
+    use_gzip = "gzip" in request.headers.get("accept-encoding", "")
+    etag, body = order_form.get_gzip() if use_gzip else order_form.get()
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Заказ целиком (заказ, клиент, позиции с товарами, платежи, движения) —
+# собирается в JSON на стороне PostgreSQL за один запрос
+ORDER_AGGREGATE_SQL = text("""
+    SELECT json_build_object(
+        'order', to_json(o),
+        'customer', (
+            SELECT to_json(c) FROM customer c WHERE c.customer_id = o.customer_id
+        ),
+        'items', COALESCE((
+            SELECT json_agg(json_build_object(
+                'order_item_id', oi.order_item_id,
+                'product_id', oi.product_id,
+                'product_name', p.product_name,
+                'unit', p.unit,
+                'product_price', p.price,
+                'quantity', oi.quantity,
+                'item_price', oi.item_price,
+                'item_discount', oi.item_discount,
+                'total_price', oi.total_price
+            ) ORDER BY oi.order_item_id)
+            FROM orders_item oi
+            JOIN product p ON p.product_id = oi.product_id
+            WHERE oi.order_id = o.order_id
+        ), '[]'::json),
+        'payments', COALESCE((
+            SELECT json_agg(to_json(pm) ORDER BY pm.payment_id)
+            FROM payment pm
+            WHERE pm.order_id = o.order_id
+        ), '[]'::json),
+        'stock_movements', COALESCE((
+            SELECT json_agg(to_json(sm) ORDER BY sm.movement_id)
+            FROM stock_movement sm
+            WHERE sm.reference_type = 'order' AND sm.reference_id = o.order_id
+        ), '[]'::json)
+    )::text
+    FROM orders o
+    WHERE o.order_id = :order_id
+""")
+
+@router.get("/{order_id}/full")
+async def get_order_aggregate(
+    order_id: int,
+    db: Session = Depends(get_db),
+    current_user = Depends(require_permission(PermissionCode.ORDERS_VIEW))
+):
+    """
+    Заказ со всеми связанными данными за один запрос к БД.
+    JSON формирует PostgreSQL, ответ отдаётся без повторной сериализации.
+    """
+    payload = db.scalar(ORDER_AGGREGATE_SQL, {"order_id": order_id})
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Заказ не найден")
+    return Response(content=payload, media_type="application/json")
 
 @router.get("/{order_id}")
 async def get_order(
@@ -99,6 +496,106 @@ async def get_order(
         "items": items
     }
 
+def _diff_order_items(current: List[tuple], items: List[dict]):
+    """
+    Сравнивает текущие позиции (order_item_id, product_id, quantity, item_price,
+    item_discount) с новыми. Позиции сопоставляются по product_id
+    (в заказе он уникален).
+
+    Возвращает (вставить, изменить, удалить order_item_id, {product_id: +/-кол-во}).
+    """
+    existing = {row[1]: row for row in current}
+    wanted = {item["product_id"]: item for item in items}
+    
+    to_insert = [item for product_id, item in wanted.items() if product_id not in existing]
+    to_delete = [row[0] for product_id, row in existing.items() if product_id not in wanted]
+    to_update = []
+    quantity_deltas = {}
+    
+    for product_id, item in wanted.items():
+        row = existing.get(product_id)
+        old_quantity = row[2] if row else 0
+        if item["quantity"] != old_quantity:
+            quantity_deltas[product_id] = item["quantity"] - old_quantity
+        if row and (row[2], row[3], row[4]) != (item["quantity"], item["item_price"], item["item_discount"]):
+            to_update.append({
+                "item_id": row[0],
+                "new_quantity": item["quantity"],
+                "new_price": item["item_price"],
+                "new_discount": item["item_discount"]
+            })
+    for product_id, row in existing.items():
+        if product_id not in wanted:
+            quantity_deltas[product_id] = -row[2]
+    
+    return to_insert, to_update, to_delete, quantity_deltas
+
+def _apply_item_diff(db: Session, order_id: int, items: List[dict], employee_id: int) -> dict:
+    """
+    Применяет к позициям заказа только изменения: DELETE удалённых,
+    многострочный INSERT новых, пакетный UPDATE изменённых, и компенсирующие
+    движения товара одним INSERT (больше позиций — outgoing, меньше — incoming).
+    Увеличение сверх доступного остатка — ValueError, до каких-либо изменений.
+
+    Уже заказанные товары сохраняют цену заказа, новые оцениваются по каталогу.
+    Возвращает (изменения, новый total_amount).
+    """
+    current = db.execute(
+        select(OrderItem.order_item_id, OrderItem.product_id, OrderItem.quantity,
+               OrderItem.item_price, OrderItem.item_discount)
+        .where(OrderItem.order_id == order_id)
+        .with_for_update()
+    ).all()
+    prices = {row.product_id: row.item_price for row in current}
+    prices.update(fetch_prices(db, (item["product_id"] for item in items if item["product_id"] not in prices)))
+    total_amount = price_items(items, prices)
+    
+    to_insert, to_update, to_delete, quantity_deltas = _diff_order_items(current, items)
+    
+    # Увеличение позиций списывает товар — проверяем остаток, как при создании заказа
+    stock = read_available_stock(db, (pid for pid, delta in quantity_deltas.items() if delta > 0))
+    for product_id, delta in sorted(quantity_deltas.items()):
+        if delta <= 0:
+            continue
+        available = stock.get(product_id)
+        if available is None:
+            raise ValueError(f"Товар {product_id} не найден или неактивен")
+        if available < delta:
+            raise ValueError(f"Недостаточно товара {product_id} на складе")
+    
+    if to_delete:
+        db.execute(delete(OrderItem).where(OrderItem.order_item_id.in_(to_delete)))
+    if to_insert:
+        db.execute(insert(OrderItem), [{**item, "order_id": order_id} for item in to_insert])
+    if to_update:
+        order_item = OrderItem.__table__
+        db.execute(
+            update(order_item)
+            .where(order_item.c.order_item_id == bindparam("item_id"))
+            .values(
+                quantity=bindparam("new_quantity"),
+                item_price=bindparam("new_price"),
+                item_discount=bindparam("new_discount")
+            ),
+            to_update
+        )
+    
+    insert_movements(db, [
+        {
+            "product_id": product_id,
+            "movement_type": "outgoing" if delta > 0 else "incoming",
+            "quantity": abs(delta),
+            "reference_id": order_id,
+            "reference_type": "order",
+            "employee_id": employee_id,
+            "notes": f"Изменение заказа #{order_id}"
+        }
+        for product_id, delta in sorted(quantity_deltas.items())
+    ])
+    
+    changes = {"inserted": len(to_insert), "updated": len(to_update), "deleted": len(to_delete)}
+    return changes, total_amount
+
 @router.put("/{order_id}")
 async def update_order(
     order_id: int,
@@ -121,24 +618,24 @@ async def update_order(
         order.discount_percent = Decimal(str(order_data["discount_percent"]))
     if "notes" in order_data:
         order.notes = order_data["notes"]
-    if "total_amount" in order_data:
-        order.total_amount = Decimal(str(order_data["total_amount"]))
     
-    # Обновляем позиции заказа
+    # Обновляем позиции заказа: применяем только разницу, сумму пересчитывает сервер
+    changes = None
     if "items" in order_data:
-        # Удаляем старые позиции
-        db.query(OrderItem).filter(OrderItem.order_id == order_id).delete()
-        
-        # Добавляем новые позиции
-        for item in order_data["items"]:
-            order_item = OrderItem(
-                order_id=order_id,
-                product_id=item["product_id"],
-                quantity=item["quantity"],
-                item_price=Decimal(str(item["item_price"])),
-                item_discount=Decimal(str(item.get("item_discount", 0)))
-            )
-            db.add(order_item)
+        try:
+            items = _parse_items(order_data["items"])
+            changes, order.total_amount = _apply_item_diff(db, order_id, items, current_user.employee_id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except IntegrityError:
+            # Остаток успел уйти параллельным заказом (CHECK stock_quantity >= 0)
+            db.rollback()
+            raise HTTPException(status_code=400, detail="Недостаточно товара на складе")
     
     db.commit()
-    return {"message": "Заказ обновлен"}
\ No newline at end of file
+    if changes is not None:
+        order_form_products.invalidate()
+    result = {"message": "Заказ обновлен"}
+    if changes is not None:
+        result["items_changes"] = changes
+    return result
\ No newline at end of file
@@ -1,26 +1,93 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import List, Optional
 from models.database import get_db
 from models.tables import PriceHistory, Product, Employee
+from dependencies import require_permission
+from core.permissions import PermissionCode
+from core.serialization import RowSerializer
+from core.pagination import decode_cursor, keyset, split_page
+from core.price_asof import prices_as_of
+from schemas.price_history import PriceHistoryRow
 
 router = APIRouter(prefix="/api/price-history", tags=["price_history"])
 
+price_history_rows = RowSerializer(
+    PriceHistoryRow, PriceHistory,
+    product_name=Product.product_name,
+    employee_name=Employee.full_name
+)
+
+class PriceAsOfQuery(BaseModel):
+    product_id: int
+    at: datetime
+
+class PriceAsOfBatch(BaseModel):
+    items: List[PriceAsOfQuery] = Field(..., min_length=1, max_length=1000)
+
+def _as_of_result(query: PriceAsOfQuery, price) -> dict:
+    return {
+        "product_id": query.product_id,
+        "at": query.at,
+        "price": float(price) if price is not None else None
+    }
+
+@router.get("/as-of")
+def get_price_as_of(
+    product_id: int,
+    at: datetime,
+    db: Session = Depends(get_db),
+    current_user = Depends(require_permission(PermissionCode.PRODUCTS_VIEW))
+):
+    """Цена товара на момент at (по истории цен)"""
+    price = prices_as_of(db, [(product_id, at)])[0]
+    if price is None:
+        raise HTTPException(status_code=404, detail="Товар не найден")
+    return _as_of_result(PriceAsOfQuery(product_id=product_id, at=at), price)
+
+@router.post("/as-of")
+def get_prices_as_of(
+    batch: PriceAsOfBatch,
+    db: Session = Depends(get_db),
+    current_user = Depends(require_permission(PermissionCode.PRODUCTS_VIEW))
+):
+    """
+    Цены на моменты времени для списка (product_id, at) — в том же порядке.
+    Для несуществующего товара price = null.
+    """
+    prices = prices_as_of(db, [(item.product_id, item.at) for item in batch.items])
+    return [_as_of_result(item, price) for item, price in zip(batch.items, prices)]
+
 @router.get("/")
-def get_price_history(db: Session = Depends(get_db)):
-    history = db.query(PriceHistory).order_by(PriceHistory.change_date.desc()).all()
-    result = []
-    for h in history:
-        product = db.query(Product).filter(Product.product_id == h.product_id).first()
-        employee = db.query(Employee).filter(Employee.employee_id == h.changed_by_employee_id).first()
-        result.append({
-            "price_history_id": h.price_history_id,
-            "product_id": h.product_id,
-            "product_name": product.product_name if product else None,
-            "old_price": float(h.old_price) if h.old_price else None,
-            "new_price": float(h.new_price),
-            "change_date": h.change_date,
-            "changed_by_employee_id": h.changed_by_employee_id,
-            "employee_name": employee.full_name if employee else None,
-            "reason": h.reason
-        })
-    return result
+def get_price_history(
+    product_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user = Depends(require_permission(PermissionCode.PRODUCTS_VIEW))
+):
+    """
+    История цен, новые изменения сверху: один запрос с join товара и сотрудника,
+    keyset-пагинация (курсор следующей страницы — в заголовке X-Next-Cursor).
+    С product_id — диапазонное сканирование индекса idx_price_history_product_date.
+    """
+    query = (
+        price_history_rows.select()
+        .outerjoin(Product, Product.product_id == PriceHistory.product_id)
+        .outerjoin(Employee, Employee.employee_id == PriceHistory.changed_by_employee_id)
+    )
+    if product_id:
+        query = query.where(PriceHistory.product_id == product_id)
+    if date_from:
+        query = query.where(PriceHistory.change_date >= date_from)
+    if date_to:
+        query = query.where(PriceHistory.change_date < date_to)
+
+    after = decode_cursor(cursor, datetime.fromisoformat, int)
+    query = keyset(query, (PriceHistory.change_date, PriceHistory.price_history_id), after, limit)
+    rows, headers = split_page(db.execute(query).all(), limit, lambda r: (r.change_date, r.price_history_id))
+    return price_history_rows.response(rows, headers)
@@ -1,23 +1,30 @@
 # routes/products.py
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import select, insert, literal, cast, String, union_all
+from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
 
 from models.database import get_db
 from models.tables import Product, Category, Supplier, Employee
 from dependencies import require_permission, get_current_user
 from core.permissions import PermissionCode
+from core.serialization import RowSerializer
+from core.order_form import order_form_products
+from core.price_asof import price_intervals
+from core.stock import fold_product_shards
 
 # Импортируем схемы ТОЛЬКО из schemas.product
-from schemas.product import ProductCreate, ProductUpdate, ProductResponse
+from schemas.product import ProductCreate, ProductUpdate, ProductResponse, ProductRow
 
 router = APIRouter(
     prefix="/api/products",
     tags=["Товары"]
 )
 
-@router.get("/", response_model=List[ProductResponse])
+product_rows = RowSerializer(ProductRow, Product)
+
+@router.get("/")
 async def get_products(
     skip: int = 0,
     limit: int = 100,
@@ -29,9 +36,10 @@ async def get_products(
     current_user: Employee = Depends(require_permission(PermissionCode.PRODUCTS_VIEW))
 ):
     """
-    Получить список товаров с фильтрацией
+    Получить список товаров с фильтрацией.
+    Выбираются только колонки ответа, строки сериализуются без ORM-объектов.
     """
-    query = select(Product)
+    query = product_rows.select()
     
     if active_only is True:
         query = query.where(Product.is_active == True)
@@ -54,8 +62,7 @@ async def get_products(
     
     query = query.offset(skip).limit(limit)
     
-    products = db.scalars(query).all()
-    return products
+    return product_rows.response(db.execute(query).all())
 
 @router.get("/{product_id}", response_model=ProductResponse)
 async def get_product(
@@ -76,6 +83,81 @@ async def get_product(
     
     return product
 
+# Максимальное число товаров в одном пакетном запросе
+PRODUCT_BATCH_LIMIT = 1000
+
+# Ограничения БД -> сообщения для пользователя (на случай гонки между проверкой и INSERT)
+CONSTRAINT_MESSAGES = {
+    "product_barcode_key": "Товар с таким штрихкодом уже существует",
+    "product_category_id_fkey": "Указанная категория не существует",
+    "product_supplier_id_fkey": "Указанный поставщик не существует",
+}
+
+def _constraint_message(error: IntegrityError) -> str:
+    constraint = getattr(getattr(error.orig, "diag", None), "constraint_name", None)
+    return CONSTRAINT_MESSAGES.get(constraint, "Нарушено ограничение целостности данных")
+
+def _find_product_errors(db: Session, products: List[ProductCreate]) -> List[dict]:
+    """
+    Проверяет категории, поставщиков и штрихкоды для набора товаров
+    одним запросом (UNION ALL по трём справочникам).
+    Возвращает список ошибок вида {"index": i, "error": "..."}.
+    """
+    category_ids = {p.category_id for p in products}
+    supplier_ids = {p.supplier_id for p in products if p.supplier_id}
+    barcodes = {p.barcode for p in products if p.barcode}
+
+    parts = [
+        select(literal("category"), cast(Category.category_id, String))
+        .where(Category.category_id.in_(category_ids))
+    ]
+    if supplier_ids:
+        parts.append(
+            select(literal("supplier"), cast(Supplier.supplier_id, String))
+            .where(Supplier.supplier_id.in_(supplier_ids))
+        )
+    if barcodes:
+        parts.append(
+            select(literal("barcode"), Product.barcode)
+            .where(Product.barcode.in_(barcodes))
+        )
+    query = parts[0] if len(parts) == 1 else union_all(*parts)
+    found = {tuple(row) for row in db.execute(query).all()}
+
+    errors = []
+    seen_barcodes = set()
+    for index, p in enumerate(products):
+        if ("category", str(p.category_id)) not in found:
+            errors.append({"index": index, "error": "Указанная категория не существует"})
+        if p.supplier_id and ("supplier", str(p.supplier_id)) not in found:
+            errors.append({"index": index, "error": "Указанный поставщик не существует"})
+        if p.barcode:
+            if ("barcode", p.barcode) in found:
+                errors.append({"index": index, "error": "Товар с таким штрихкодом уже существует"})
+            elif p.barcode in seen_barcodes:
+                errors.append({"index": index, "error": "Штрихкод повторяется в пакете"})
+            seen_barcodes.add(p.barcode)
+    return errors
+
+def _insert_products(db: Session, products: List[ProductCreate], employee_id: int) -> List[dict]:
+    """INSERT ... RETURNING для набора товаров, без повторного чтения (refresh)"""
+    values = [
+        {**p.model_dump(), "created_by_employee_id": employee_id}
+        for p in products
+    ]
+    statement = insert(Product).returning(*product_rows.columns, sort_by_parameter_order=True)
+    try:
+        rows = db.execute(statement, values).all()
+        db.commit()
+        order_form_products.invalidate()
+    except IntegrityError as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=_constraint_message(e)
+        )
+    return product_rows.to_dicts(rows)
+
 @router.post("/", response_model=ProductResponse, status_code=status.HTTP_201_CREATED)
 async def create_product(
     product_data: ProductCreate,
@@ -83,54 +165,43 @@ async def create_product(
     current_user: Employee = Depends(require_permission(PermissionCode.PRODUCTS_CREATE))
 ):
     """
-    Создать новый товар
+    Создать новый товар.
+    Категория, поставщик и штрихкод проверяются одним запросом.
     """
-    # Проверяем существование категории
-    category = db.scalar(
-        select(Category).where(Category.category_id == product_data.category_id)
-    )
-    if not category:
+    errors = _find_product_errors(db, [product_data])
+    if errors:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Указанная категория не существует"
+            detail=errors[0]["error"]
         )
     
-    # Проверяем существование поставщика (если указан)
-    if product_data.supplier_id:
-        supplier = db.scalar(
-            select(Supplier).where(Supplier.supplier_id == product_data.supplier_id)
-        )
-        if not supplier:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Указанный поставщик не существует"
-            )
-    
-    # Проверяем уникальность баркода (если указан)
-    if product_data.barcode:
-        existing_product = db.scalar(
-            select(Product).where(Product.barcode == product_data.barcode)
+    return _insert_products(db, [product_data], current_user.employee_id)[0]
+
+@router.post("/batch", response_model=List[ProductResponse], status_code=status.HTTP_201_CREATED)
+async def create_products_batch(
+    products_data: List[ProductCreate],
+    db: Session = Depends(get_db),
+    current_user: Employee = Depends(require_permission(PermissionCode.PRODUCTS_CREATE))
+):
+    """
+    Создать несколько товаров за один запрос.
+
+    Проверка выполняется для всего пакета сразу; при любой ошибке
+    ничего не создаётся и возвращается список ошибок с индексами товаров.
+    """
+    if not products_data:
+        return []
+    if len(products_data) > PRODUCT_BATCH_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Не более {PRODUCT_BATCH_LIMIT} товаров за один запрос"
         )
-        if existing_product:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Товар с таким штрихкодом уже существует"
-            )
-    
-    # Подготавливаем данные для создания
-    product_dict = product_data.model_dump()
-    
-    # Создаем новый товар
-    new_product = Product(
-        **product_dict,
-        created_by_employee_id=current_user.employee_id
-    )
     
-    db.add(new_product)
-    db.commit()
-    db.refresh(new_product)
+    errors = _find_product_errors(db, products_data)
+    if errors:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=errors)
     
-    return new_product
+    return _insert_products(db, products_data, current_user.employee_id)
 
 @router.put("/{product_id}", response_model=ProductResponse)
 async def update_product(
@@ -173,6 +244,19 @@ async def update_product(
     update_data = product_data.model_dump(exclude_unset=True)
     price_changed = False
     
+    # Отключение шардированного счётчика: сначала свернуть шарды товара,
+    # иначе чтение остатка перестанет их учитывать (шард от заказа,
+    # завершившегося уже после этого, свернёт периодический fold_stock_shards)
+    if update_data.get("stock_shards") == 0 and product.stock_shards > 0:
+        try:
+            with db.begin_nested():
+                fold_product_shards(db, product_id)
+        except IntegrityError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Нельзя отключить шарды: остаток с учётом шардов отрицательный"
+            )
+    
     try:
         db.execute(text("SET session_replication_role = 'replica'"))
         
@@ -186,6 +270,7 @@ async def update_product(
         
         product.updated_by_employee_id = current_user.employee_id
         db.commit()
+        order_form_products.invalidate()
         
         db.execute(text("SET session_replication_role = 'origin'"))
         
@@ -199,6 +284,7 @@ async def update_product(
             )
             db.add(price_history)
             db.commit()
+            price_intervals.invalidate(product_id)
     except Exception:
         db.rollback()
         try:
@@ -238,6 +324,7 @@ async def delete_product(
             setattr(product, 'is_active', False)
             setattr(product, 'updated_by_employee_id', current_user.employee_id)
             db.commit()
+            order_form_products.invalidate()
             return
         except Exception as e:
             db.rollback()
@@ -257,6 +344,7 @@ async def delete_product(
     try:
         db.delete(product)
         db.commit()
+        order_form_products.invalidate()
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Ошибка при удалении товара: {str(e)}")
\ No newline at end of file
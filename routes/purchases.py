@@ -1,25 +1,47 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, lateral, select, true
 from sqlalchemy.orm import Session
-from typing import List
-from datetime import date, datetime
-from pydantic import BaseModel
+from typing import List, Optional
+from datetime import date
+from pydantic import BaseModel, Field
 from models.database import get_db
-from models.tables import Purchase, PurchaseItem, Product, Supplier, Employee, StockMovement
+from models.tables import Purchase, PurchaseItem, Product, Supplier, Employee
 from dependencies import require_permission
 from core.permissions import PermissionCode
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.pdfgen import canvas
-from reportlab.platypus import Table, TableStyle
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.fonts import addMapping
-from io import BytesIO
-import os
+from core.order_form import order_form_products
+from core.receiving import receive_purchase, unknown_purchase_items
+from core.replenishment import MAX_WINDOW_DAYS, REVIEW_DAYS, SAFETY_DAYS, VELOCITY_WINDOWS, draft_purchases
+from core.serialization import RowSerializer
+from core.pagination import decode_cursor, keyset, split_page
+from schemas.purchase import PurchaseListRow, PurchaseListItemsRow
+from core.documents import load_invoices
+from core.pdf_cache import pdf_response
 
 router = APIRouter(prefix="/api/purchases", tags=["purchases"])
 
+purchase_list_rows = RowSerializer(
+    PurchaseListRow, Purchase,
+    supplier_name=Supplier.company_name,
+    employee_name=Employee.full_name
+)
+
+# Сводка по позициям считается только для строк страницы (LATERAL)
+_items_summary = lateral(
+    select(
+        func.count().label("items_count"),
+        func.coalesce(func.sum(PurchaseItem.quantity), 0).label("total_quantity")
+    )
+    .where(PurchaseItem.purchase_id == Purchase.purchase_id)
+    .correlate(Purchase)
+).alias("items_summary")
+
+purchase_list_items_rows = RowSerializer(
+    PurchaseListItemsRow, Purchase, _items_summary.c,
+    supplier_name=Supplier.company_name,
+    employee_name=Employee.full_name
+)
+
 class PurchaseItemCreate(BaseModel):
     product_id: int
     quantity: int
@@ -35,6 +57,13 @@ class PurchaseCreate(BaseModel):
     notes: str = None
     items: List[PurchaseItemCreate]
 
+class PurchaseReceiveLine(BaseModel):
+    purchase_item_id: int
+    quantity: Optional[int] = Field(None, gt=0)  # None — весь остаток позиции
+
+class PurchaseReceive(BaseModel):
+    items: Optional[List[PurchaseReceiveLine]] = None  # None — вся закупка
+
 class PurchaseUpdate(BaseModel):
     purchase_date: str = None
     supplier_id: int = None
@@ -45,30 +74,62 @@ class PurchaseUpdate(BaseModel):
 
 @router.get("/")
 def get_purchases(
+    supplier_id: Optional[int] = None,
+    status: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    with_items: bool = False,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(get_db),
     current_user = Depends(require_permission(PermissionCode.PURCHASES_VIEW))
 ):
-    purchases = db.query(Purchase).all()
-    result = []
-    for p in purchases:
-        supplier = db.query(Supplier).filter(Supplier.supplier_id == p.supplier_id).first()
-        employee = db.query(Employee).filter(Employee.employee_id == p.employee_id).first()
-        result.append({
-            "purchase_id": p.purchase_id,
-            "purchase_code": p.purchase_code,
-            "purchase_date": p.purchase_date,
-            "supplier_id": p.supplier_id,
-            "supplier_name": supplier.company_name if supplier else None,
-            "total_amount": float(p.total_amount) if p.total_amount else 0,
-            "delivery_date": p.delivery_date,
-            "employee_id": p.employee_id,
-            "employee_name": employee.full_name if employee else None,
-            "status": p.status,
-            "invoice_number": p.invoice_number,
-            "notes": p.notes,
-            "created_at": p.created_at
-        })
-    return result
+    """
+    Список закупок, новые сверху: один запрос с join поставщика и сотрудника,
+    keyset-пагинация (курсор следующей страницы — в заголовке X-Next-Cursor).
+    with_items=true добавляет items_count и total_quantity по позициям.
+    """
+    serializer = purchase_list_items_rows if with_items else purchase_list_rows
+    query = (
+        serializer.select()
+        .select_from(Purchase)
+        .outerjoin(Supplier, Supplier.supplier_id == Purchase.supplier_id)
+        .outerjoin(Employee, Employee.employee_id == Purchase.employee_id)
+    )
+    if with_items:
+        query = query.join(_items_summary, true())
+    if supplier_id:
+        query = query.where(Purchase.supplier_id == supplier_id)
+    if status:
+        query = query.where(Purchase.status == status)
+    if date_from:
+        query = query.where(Purchase.purchase_date >= date_from)
+    if date_to:
+        query = query.where(Purchase.purchase_date <= date_to)
+
+    after = decode_cursor(cursor, date.fromisoformat, int)
+    query = keyset(query, (Purchase.purchase_date, Purchase.purchase_id), after, limit)
+    rows, headers = split_page(db.execute(query).all(), limit, lambda r: (r.purchase_date, r.purchase_id))
+    return serializer.response(rows, headers)
+
+@router.get("/replenishment")
+def get_replenishment(
+    supplier_id: Optional[int] = None,
+    safety_days: float = Query(SAFETY_DAYS, ge=0, le=365),
+    review_days: float = Query(REVIEW_DAYS, ge=0, le=365),
+    window: List[int] = Query(list(VELOCITY_WINDOWS)),
+    db: Session = Depends(get_db),
+    current_user = Depends(require_permission(PermissionCode.PURCHASES_VIEW))
+):
+    """
+    Черновики закупок по поставщикам: что и сколько заказать по скорости
+    расхода и сроку поставки. window — окна расхода в днях
+    (?window=7&window=30), скорость — среднее по ним. Ничего не сохраняет;
+    позиции черновика можно отправить в POST /api/purchases/.
+    """
+    if not all(1 <= w <= MAX_WINDOW_DAYS for w in window):
+        raise HTTPException(status_code=400, detail=f"window: от 1 до {MAX_WINDOW_DAYS} дней")
+    return draft_purchases(db, window, safety_days=safety_days, review_days=review_days, supplier_id=supplier_id)
 
 @router.get("/{purchase_id}")
 def get_purchase(
@@ -89,6 +150,7 @@ def get_purchase(
             "product_id": item.product_id,
             "product_name": product.product_name if product else None,
             "quantity": item.quantity,
+            "received_quantity": item.received_quantity,
             "unit_price": float(item.unit_price)
         })
     
@@ -137,21 +199,14 @@ def create_purchase(
             unit_price=item.unit_price
         )
         db.add(new_item)
-        
-        # Если статус "delivered", создаём движение товара
-        if purchase.status == "delivered":
-            movement = StockMovement(
-                product_id=item.product_id,
-                movement_type="incoming",
-                quantity=item.quantity,
-                reference_id=new_purchase.purchase_id,
-                reference_type="purchase",
-                employee_id=purchase.employee_id,
-                notes=f"Закупка #{new_purchase.purchase_id}"
-            )
-            db.add(movement)
+    
+    # Закупка сразу со статусом "delivered" принимается на склад целиком
+    if purchase.status == "delivered":
+        receive_purchase(db, new_purchase, purchase.employee_id)
     
     db.commit()
+    if purchase.status == "delivered":
+        order_form_products.invalidate()
     db.refresh(new_purchase)
     return {"purchase_id": new_purchase.purchase_id}
 
@@ -162,7 +217,7 @@ def update_purchase(
     db: Session = Depends(get_db),
     current_user = Depends(require_permission(PermissionCode.PURCHASES_CREATE))
 ):
-    db_purchase = db.query(Purchase).filter(Purchase.purchase_id == purchase_id).first()
+    db_purchase = db.query(Purchase).filter(Purchase.purchase_id == purchase_id).with_for_update().first()
     if not db_purchase:
         raise HTTPException(status_code=404, detail="Purchase not found")
     
@@ -181,25 +236,50 @@ def update_purchase(
     if purchase.notes is not None:
         db_purchase.notes = purchase.notes
     
-    # Создаём записи о движении при смене статуса на "delivered"
+    # При смене статуса на "delivered" принимаем всё, что ещё не принято
     if purchase.status == "delivered" and old_status != "delivered":
-        items = db.query(PurchaseItem).filter(PurchaseItem.purchase_id == purchase_id).all()
-        for item in items:
-            # Триггер БД автоматически увеличит stock_quantity
-            movement = StockMovement(
-                product_id=item.product_id,
-                movement_type="incoming",
-                quantity=item.quantity,
-                reference_id=purchase_id,
-                reference_type="purchase",
-                employee_id=db_purchase.employee_id,
-                notes=f"Закупка #{purchase_id}"
-            )
-            db.add(movement)
+        receive_purchase(db, db_purchase, db_purchase.employee_id)
     
     db.commit()
+    if purchase.status == "delivered" and old_status != "delivered":
+        order_form_products.invalidate()
     return {"message": "Purchase updated"}
 
+@router.post("/{purchase_id}/receive")
+def receive_purchase_items(
+    purchase_id: int,
+    receive: PurchaseReceive,
+    db: Session = Depends(get_db),
+    current_user = Depends(require_permission(PermissionCode.PURCHASES_CREATE))
+):
+    """
+    Приёмка закупки на склад: вся закупка или выбранные позиции
+    (частичная поставка). Когда принято всё, статус становится "delivered".
+    """
+    db_purchase = db.query(Purchase).filter(Purchase.purchase_id == purchase_id).with_for_update().first()
+    if not db_purchase:
+        raise HTTPException(status_code=404, detail="Purchase not found")
+    if db_purchase.status != "ordered":
+        raise HTTPException(status_code=400, detail=f"Закупка в статусе '{db_purchase.status}' не может быть принята")
+    
+    lines = None
+    if receive.items is not None:
+        lines = {line.purchase_item_id: line.quantity for line in receive.items}
+        if not lines:
+            raise HTTPException(status_code=400, detail="Не выбраны позиции для приёмки")
+        unknown = unknown_purchase_items(db, purchase_id, lines)
+        if unknown:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Позиции не найдены в закупке: {', '.join(map(str, unknown))}"
+            )
+    
+    result = receive_purchase(db, db_purchase, current_user.employee_id, lines)
+    db.commit()
+    if result["received_quantity"]:
+        order_form_products.invalidate()
+    return result
+
 @router.delete("/{purchase_id}")
 def delete_purchase(
     purchase_id: int,
@@ -232,179 +312,14 @@ def get_products(
     return [{"product_id": p.product_id, "product_name": p.product_name, "price": float(p.price)} for p in products]
 
 @router.get("/{purchase_id}/pdf")
-def download_purchase_pdf(
+async def download_purchase_pdf(
     purchase_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     current_user = Depends(require_permission(PermissionCode.PURCHASES_VIEW))
 ):
-    purchase = db.query(Purchase).filter(Purchase.purchase_id == purchase_id).first()
-    if not purchase:
+    invoice = (await run_in_threadpool(load_invoices, db, [purchase_id])).get(purchase_id)
+    if not invoice:
         raise HTTPException(status_code=404, detail="Purchase not found")
     
-    supplier = db.query(Supplier).filter(Supplier.supplier_id == purchase.supplier_id).first()
-    employee = db.query(Employee).filter(Employee.employee_id == purchase.employee_id).first()
-    items = db.query(PurchaseItem).filter(PurchaseItem.purchase_id == purchase_id).all()
-    
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-    
-    # Регистрируем шрифт DejaVu с поддержкой кириллицы
-    font_path = "C:/Windows/Fonts/DejaVuSans.ttf"
-    font_bold_path = "C:/Windows/Fonts/DejaVuSans-Bold.ttf"
-    
-    if os.path.exists(font_path):
-        pdfmetrics.registerFont(TTFont('DejaVu', font_path))
-        pdfmetrics.registerFont(TTFont('DejaVuBold', font_bold_path))
-    else:
-        # Fallback на Arial если DejaVu не найден
-        font_path = "C:/Windows/Fonts/arial.ttf"
-        font_bold_path = "C:/Windows/Fonts/arialbd.ttf"
-        pdfmetrics.registerFont(TTFont('DejaVu', font_path))
-        pdfmetrics.registerFont(TTFont('DejaVuBold', font_bold_path))
-    
-    # Заголовок
-    c.setFillColorRGB(0.42, 0.07, 0.8)
-    c.rect(0, height - 120, width, 120, fill=1, stroke=0)
-    
-    c.setFillColorRGB(1, 1, 1)
-    c.setFont("DejaVuBold", 38)
-    c.drawString(40, height - 65, "НАКЛАДНАЯ")
-    c.setFont("DejaVu", 13)
-    c.drawString(40, height - 88, f"№ {purchase.purchase_code}")
-    c.drawString(width - 200, height - 88, f"{purchase.purchase_date}")
-    
-    # Карточка с информацией о закупке
-    y = height - 140
-    c.setFillColorRGB(0.95, 0.96, 0.98)
-    c.roundRect(30, y - 110, width - 60, 105, 15, fill=1, stroke=0)
-    c.setStrokeColorRGB(0.42, 0.07, 0.8)
-    c.setLineWidth(2)
-    c.roundRect(30, y - 110, width - 60, 105, 15, fill=0, stroke=1)
-    
-    c.setFillColorRGB(0, 0, 0)
-    c.setFont("DejaVuBold", 11)
-    c.drawString(45, y - 20, "ИНФОРМАЦИЯ О ЗАКУПКЕ")
-    
-    y -= 45
-    c.setFillColorRGB(0, 0, 0)
-    c.setFont("DejaVu", 10)
-    c.drawString(45, y, f"Дата закупки: {purchase.purchase_date}")
-    c.drawString(width - 280, y, f"Статус: {purchase.status}")
-    y -= 22
-    if purchase.delivery_date:
-        c.drawString(45, y, f"Дата доставки: {purchase.delivery_date}")
-    if purchase.invoice_number:
-        c.drawString(width - 280, y, f"Номер счета: {purchase.invoice_number}")
-    y -= 25
-    
-    # Карточки поставщика и ответственного
-    y -= 20
-    card_width = (width - 80) / 2
-    
-    if supplier:
-        c.setFillColorRGB(0.95, 0.96, 0.98)
-        c.roundRect(30, y - 85, card_width, 80, 12, fill=1, stroke=0)
-        c.setStrokeColorRGB(0.42, 0.07, 0.8)
-        c.setLineWidth(1.5)
-        c.roundRect(30, y - 85, card_width, 80, 12, fill=0, stroke=1)
-        
-        c.setFillColorRGB(0, 0, 0)
-        c.setFont("DejaVuBold", 10)
-        c.drawString(45, y - 15, "ПОСТАВЩИК")
-        c.setFillColorRGB(0, 0, 0)
-        c.setFont("DejaVu", 9)
-        c.drawString(45, y - 35, f"{supplier.company_name}")
-        if supplier.inn:
-            c.drawString(45, y - 50, f"ИНН: {supplier.inn}")
-        if supplier.contact_phone:
-            c.drawString(45, y - 65, f"Тел: {supplier.contact_phone}")
-    
-    if employee:
-        c.setFillColorRGB(0.95, 0.96, 0.98)
-        c.roundRect(width - 30 - card_width, y - 85, card_width, 80, 12, fill=1, stroke=0)
-        c.setStrokeColorRGB(0.42, 0.07, 0.8)
-        c.setLineWidth(1.5)
-        c.roundRect(width - 30 - card_width, y - 85, card_width, 80, 12, fill=0, stroke=1)
-        
-        c.setFillColorRGB(0, 0, 0)
-        c.setFont("DejaVuBold", 10)
-        c.drawString(width - 15 - card_width, y - 15, "ОТВЕТСТВЕННЫЙ")
-        c.setFillColorRGB(0, 0, 0)
-        c.setFont("DejaVu", 9)
-        c.drawString(width - 15 - card_width, y - 40, f"{employee.full_name}")
-    
-    y -= 100
-    
-    # Таблица товаров
-    y -= 30
-    c.setFillColorRGB(0, 0, 0)
-    c.setFont("DejaVuBold", 12)
-    c.drawString(40, y, "ТОВАРЫ")
-    y -= 35
-    
-    table_data = [["№", "Наименование", "Кол-во", "Цена", "Сумма"]]
-    for idx, item in enumerate(items, 1):
-        product = db.query(Product).filter(Product.product_id == item.product_id).first()
-        product_name = product.product_name if product else "—"
-        total = item.quantity * float(item.unit_price)
-        table_data.append([
-            str(idx),
-            product_name[:30],
-            str(item.quantity),
-            f"{float(item.unit_price):.2f} ₽",
-            f"{total:.2f} ₽"
-        ])
-    
-    table = Table(table_data, colWidths=[30, 250, 60, 80, 95])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#6a11cb')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('ALIGN', (2, 0), (2, -1), 'CENTER'),
-        ('ALIGN', (3, 0), (-1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'DejaVuBold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('FONTNAME', (0, 1), (-1, -1), 'DejaVu'),
-        ('FONTSIZE', (0, 1), (-1, -1), 9),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('TOPPADDING', (0, 1), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e0e0e0')),
-        ('LINEABOVE', (0, 0), (-1, 0), 2, colors.HexColor('#6a11cb')),
-        ('LINEBELOW', (0, 0), (-1, 0), 2, colors.HexColor('#6a11cb')),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
-        ('ROUNDEDCORNERS', [15, 15, 15, 15])
-    ]))
-    
-    table.wrapOn(c, width, height)
-    table.drawOn(c, 40, y - len(table_data) * 25)
-    
-    # Итого
-    y = y - len(table_data) * 25 - 50
-    c.setFillColorRGB(0.42, 0.07, 0.8)
-    c.roundRect(width - 300, y - 65, 270, 60, 12, fill=1, stroke=0)
-    
-    c.setFillColorRGB(1, 1, 1)
-    c.setFont("DejaVuBold", 16)
-    c.drawString(width - 285, y - 25, "ИТОГО")
-    c.setFont("DejaVuBold", 24)
-    c.drawString(width - 285, y - 50, f"{float(purchase.total_amount):.2f} ₽")
-    
-    # Футер
-    c.setFillColorRGB(0, 0, 0)
-    c.setFont("DejaVuBold", 11)
-    c.drawString(40, 40, "Документ сформирован автоматически")
-    c.setFillColorRGB(0.3, 0.3, 0.3)
-    c.setFont("DejaVu", 8)
-    c.drawString(40, 25, f"Дата формирования: {datetime.now().strftime('%d.%m.%Y %H:%M')}")
-    c.drawString(width - 220, 25, "Система управления складом")
-    
-    c.save()
-    buffer.seek(0)
-    
-    return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename=purchase_{purchase.purchase_code}.pdf"}
-    )
+    return await pdf_response(request, "invoice", invoice, f"purchase_{invoice['purchase_code']}.pdf")
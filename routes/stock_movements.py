@@ -1,14 +1,21 @@
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
-from sqlalchemy import select
-from typing import List
+from sqlalchemy import func, select
+from datetime import datetime
+from typing import List, Optional
 
 from models.database import get_db
 from models.tables import StockMovement, Employee
 from dependencies import require_permission, get_current_user
 from core.permissions import PermissionCode
+from core.serialization import RowSerializer
+from core.pagination import decode_cursor, keyset, split_page
+from core.stock import LEDGER_QUANTITY
+from core.stock_snapshots import stock_at
+from core.stock_reconcile import RECONCILE_FIX_MAX_PRODUCTS, reconcile_stock
+from schemas.stock_movement import StockMovementRow, StockLedgerRow
 
 router = APIRouter(
     prefix="/api/stock-movements",
@@ -17,28 +24,107 @@ router = APIRouter(
 
 templates = Jinja2Templates(directory="templates")
 
-@router.get("/", response_model=List[dict])
+stock_movement_rows = RowSerializer(StockMovementRow, StockMovement)
+
+# Журнал с нарастающим остатком по товару. Условие на product_id Postgres
+# переносит внутрь подзапроса (это колонка PARTITION BY), поэтому для одного
+# товара окно считается по диапазону индекса idx_stock_movement_product_date
+_ledger = select(
+    StockMovement,
+    func.sum(LEDGER_QUANTITY).over(
+        partition_by=StockMovement.product_id,
+        order_by=(StockMovement.movement_date, StockMovement.movement_id)
+    ).label("balance")
+).subquery("ledger")
+
+stock_ledger_rows = RowSerializer(StockLedgerRow, _ledger.c)
+
+@router.get("/stock-at")
+def get_stock_at(
+    at: datetime,
+    product_id: Optional[List[int]] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: Employee = Depends(require_permission(PermissionCode.PRODUCTS_VIEW))
+):
+    """
+    Остаток товаров (всех или по списку product_id) на момент at:
+    ближайший снимок остатков + движения после него
+    """
+    stock = stock_at(db, at, product_id)
+    return [{"product_id": pid, "quantity": quantity} for pid, quantity in stock.items()]
+
+@router.get("/reconciliation")
+def get_stock_reconciliation(
+    product_id_from: Optional[int] = None,
+    product_id_to: Optional[int] = None,
+    current_user: Employee = Depends(require_permission(PermissionCode.REPORTS_VIEW))
+):
+    """Сверка остатков с журналом движений: расхождения по товарам (всем или из диапазона)"""
+    return reconcile_stock(product_from=product_id_from, product_to=product_id_to)
+
+@router.post("/reconciliation")
+def fix_stock_reconciliation(
+    product_id_from: int = Query(..., ge=1),
+    product_id_to: int = Query(..., ge=1),
+    current_user: Employee = Depends(require_permission(PermissionCode.STOCK_MOVEMENT))
+):
+    """
+    Сверка диапазона товаров с записью поправок adjustment на каждое
+    расхождение. Весь каталог исправляется периодической задачей
+    (python -m core.stock_reconcile --fix), а не в HTTP-запросе.
+    """
+    if product_id_to < product_id_from:
+        raise HTTPException(status_code=400, detail="product_id_to меньше product_id_from")
+    if product_id_to - product_id_from + 1 > RECONCILE_FIX_MAX_PRODUCTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Диапазон больше {RECONCILE_FIX_MAX_PRODUCTS} товаров: используйте python -m core.stock_reconcile --fix"
+        )
+    return reconcile_stock(
+        fix_employee_id=current_user.employee_id, product_from=product_id_from, product_to=product_id_to
+    )
+
+@router.get("/")
 async def get_stock_movements(
-    skip: int = 0,
-    limit: int = 100,
+    product_id: Optional[int] = None,
+    movement_type: Optional[str] = None,
+    reference_type: Optional[str] = None,
+    reference_id: Optional[int] = None,
+    employee_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    with_balance: bool = False,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(get_db),
     current_user: Employee = Depends(require_permission(PermissionCode.PRODUCTS_VIEW))
 ):
-    """Получить список движений товаров"""
-    query = select(StockMovement).offset(skip).limit(limit).order_by(StockMovement.movement_date.desc())
-    movements = db.scalars(query).all()
-    
-    return [
-        {
-            "movement_id": m.movement_id,
-            "product_id": m.product_id,
-            "movement_type": m.movement_type,
-            "quantity": m.quantity,
-            "movement_date": m.movement_date.isoformat() if m.movement_date else None,
-            "reference_id": m.reference_id,
-            "reference_type": m.reference_type,
-            "employee_id": m.employee_id,
-            "notes": m.notes
-        }
-        for m in movements
-    ]
+    """
+    Журнал движений товаров, новые сверху, keyset-пагинация (курсор следующей
+    страницы — в заголовке X-Next-Cursor). with_balance=true добавляет balance —
+    остаток по журналу после движения (нарастающий итог по товару с начала
+    истории, независимо от остальных фильтров); только вместе с product_id.
+    """
+    if with_balance and not product_id:
+        raise HTTPException(status_code=400, detail="with_balance требует product_id")
+    serializer, columns = (stock_ledger_rows, _ledger.c) if with_balance else (stock_movement_rows, StockMovement)
+    query = serializer.select()
+    if product_id:
+        query = query.where(columns.product_id == product_id)
+    if movement_type:
+        query = query.where(columns.movement_type == movement_type)
+    if reference_type:
+        query = query.where(columns.reference_type == reference_type)
+    if reference_id:
+        query = query.where(columns.reference_id == reference_id)
+    if employee_id:
+        query = query.where(columns.employee_id == employee_id)
+    if date_from:
+        query = query.where(columns.movement_date >= date_from)
+    if date_to:
+        query = query.where(columns.movement_date < date_to)
+
+    after = decode_cursor(cursor, datetime.fromisoformat, int)
+    query = keyset(query, (columns.movement_date, columns.movement_id), after, limit)
+    rows, headers = split_page(db.execute(query).all(), limit, lambda r: (r.movement_date, r.movement_id))
+    return serializer.response(rows, headers)
@@ -6,16 +6,19 @@ from models.database import get_db
 from models.tables import Supplier
 from dependencies import require_permission
 from core.permissions import PermissionCode
+from core.serialization import RowSerializer
+from schemas.supplier import SupplierRow
 
 router = APIRouter(prefix="/api/suppliers", tags=["Поставщики"])
 
+supplier_rows = RowSerializer(SupplierRow, Supplier)
+
 @router.get("/")
 async def get_suppliers(
     db: Session = Depends(get_db),
     current_user = Depends(require_permission(PermissionCode.SUPPLIERS_VIEW))
 ):
-    suppliers = db.scalars(select(Supplier)).all()
-    return suppliers
+    return supplier_rows.response(db.execute(supplier_rows.select()).all())
 
 @router.get("/{supplier_id}")
 async def get_supplier(
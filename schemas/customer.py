@@ -0,0 +1,15 @@
+from typing import Optional
+from datetime import date, datetime
+from typing_extensions import TypedDict
+
+class CustomerRow(TypedDict):
+    """Строка списка клиентов для быстрой сериализации"""
+    customer_id: int
+    customer_name: str
+    phone: str
+    email: Optional[str]
+    loyalty_card_number: Optional[str]
+    registration_date: Optional[date]
+    created_at: Optional[datetime]
+    created_by_employee_id: Optional[int]
+    notes: Optional[str]
@@ -0,0 +1,28 @@
+from typing import Optional
+from datetime import datetime
+from typing_extensions import TypedDict
+
+class OrderRow(TypedDict):
+    """Строка списка заказов для быстрой сериализации"""
+    order_id: int
+    order_code: Optional[str]
+    order_date: datetime
+    customer_id: Optional[int]
+    total_amount: float
+    status: str
+    employee_id: int
+    discount_percent: Optional[float]
+    payment_type: Optional[str]
+    notes: Optional[str]
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+
+class OrderItemRow(TypedDict):
+    """Строка позиции заказа для быстрой сериализации"""
+    order_item_id: int
+    order_id: int
+    product_id: int
+    quantity: int
+    item_price: float
+    item_discount: Optional[float]
+    created_at: Optional[datetime]
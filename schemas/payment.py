@@ -0,0 +1,55 @@
+from typing import Optional
+from datetime import date, datetime
+from typing_extensions import TypedDict
+
+class PaymentRow(TypedDict):
+    """Строка платежа для быстрой сериализации"""
+    payment_id: int
+    order_id: int
+    payment_code: Optional[str]
+    payment_date: datetime
+    amount: float
+    payment_type: str
+    payment_status: str
+    employee_id: int
+    receipt_number: Optional[str]
+    notes: Optional[str]
+    created_at: Optional[datetime]
+
+class PaymentListRow(TypedDict):
+    """Строка списка платежей: платёж + код заказа и имя сотрудника (один запрос с join)"""
+    payment_id: int
+    payment_code: Optional[str]
+    payment_date: datetime
+    order_id: int
+    order_code: Optional[str]
+    amount: float
+    payment_type: str
+    payment_status: str
+    employee_id: int
+    employee_name: Optional[str]
+    receipt_number: Optional[str]
+    notes: Optional[str]
+    created_at: Optional[datetime]
+
+class ReconciliationRow(TypedDict):
+    """
+    Строка сверки платежей. section — вид строки:
+    paid_without_payment, overpaid, duplicate_payment, daily_total
+    """
+    section: str
+    order_id: Optional[int]
+    order_code: Optional[str]
+    day: Optional[date]
+    payment_type: Optional[str]
+    payment_ids: Optional[str]
+    payments_count: Optional[int]
+    paid_amount: Optional[float]
+    expected_amount: Optional[float]
+
+class OrderPickerRow(TypedDict):
+    order_id: int
+    order_code: Optional[str]
+    order_date: Optional[datetime]
+    customer_name: Optional[str]
+    outstanding_amount: Optional[float]
@@ -0,0 +1,15 @@
+from typing import Optional
+from datetime import datetime
+from typing_extensions import TypedDict
+
+class PriceHistoryRow(TypedDict):
+    """Строка истории цен: изменение + имена товара и сотрудника (один запрос с join)"""
+    price_history_id: int
+    product_id: int
+    product_name: Optional[str]
+    old_price: Optional[float]
+    new_price: float
+    change_date: datetime
+    changed_by_employee_id: int
+    employee_name: Optional[str]
+    reason: Optional[str]
@@ -3,6 +3,7 @@ from pydantic import BaseModel, Field, validator
 from typing import Optional
 from datetime import datetime
 from decimal import Decimal
+from typing_extensions import TypedDict
 
 class ProductBase(BaseModel):
     product_name: str = Field(..., min_length=1, max_length=100, description="Название товара")
@@ -44,6 +45,7 @@ class ProductUpdate(BaseModel):
     supplier_id: Optional[int] = None
     weight: Optional[float] = Field(None, ge=0)
     is_active: Optional[bool] = None
+    stock_shards: Optional[int] = Field(None, ge=0, le=64, description="Число шардов счётчика остатка (0 — обычный режим)")
     
     @validator('price')
     def validate_price(cls, v):
@@ -65,4 +67,23 @@ class ProductResponse(ProductBase):
     updated_by_employee_id: Optional[int]
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class ProductRow(TypedDict):
+    """Строка списка товаров для быстрой сериализации (поля совпадают с ProductResponse)"""
+    product_id: int
+    product_name: str
+    description: Optional[str]
+    unit: str
+    category_id: int
+    price: float
+    stock_quantity: Optional[int]
+    barcode: Optional[str]
+    supplier_id: Optional[int]
+    weight: Optional[float]
+    is_active: Optional[bool]
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    created_by_employee_id: Optional[int]
+    updated_by_employee_id: Optional[int]
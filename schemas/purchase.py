@@ -0,0 +1,24 @@
+from typing import Optional
+from datetime import date, datetime
+from typing_extensions import TypedDict
+
+class PurchaseListRow(TypedDict):
+    """Строка списка закупок: закупка + имена поставщика и сотрудника (один запрос с join)"""
+    purchase_id: int
+    purchase_code: Optional[str]
+    purchase_date: date
+    supplier_id: int
+    supplier_name: Optional[str]
+    total_amount: Optional[float]
+    delivery_date: Optional[date]
+    employee_id: int
+    employee_name: Optional[str]
+    status: Optional[str]
+    invoice_number: Optional[str]
+    notes: Optional[str]
+    created_at: Optional[datetime]
+
+class PurchaseListItemsRow(PurchaseListRow):
+    """То же + сводка по позициям закупки"""
+    items_count: int
+    total_quantity: int
@@ -0,0 +1,20 @@
+from typing import Optional
+from datetime import datetime
+from typing_extensions import TypedDict
+
+class StockMovementRow(TypedDict):
+    """Строка движения товара для быстрой сериализации"""
+    movement_id: int
+    product_id: int
+    movement_type: str
+    quantity: int
+    movement_date: datetime
+    reference_id: Optional[int]
+    reference_type: Optional[str]
+    employee_id: int
+    notes: Optional[str]
+    created_at: Optional[datetime]
+
+class StockLedgerRow(StockMovementRow):
+    """Строка журнала движений с остатком по журналу после движения"""
+    balance: int
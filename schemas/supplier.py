@@ -0,0 +1,16 @@
+from typing import Optional
+from datetime import datetime
+from typing_extensions import TypedDict
+
+class SupplierRow(TypedDict):
+    """Строка списка поставщиков для быстрой сериализации"""
+    supplier_id: int
+    company_name: str
+    inn: Optional[str]
+    kpp: Optional[str]
+    address: Optional[str]
+    contact_phone: Optional[str]
+    contact_email: Optional[str]
+    created_at: Optional[datetime]
+    created_by_employee_id: Optional[int]
+    is_active: Optional[bool]